@@ -0,0 +1,94 @@
+import atexit
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import Case, F, IntegerField, Value, When
+
+from blog.models import Blog
+
+_pending = Counter()
+_lock = threading.Lock()
+_flushed_at = time.monotonic()
+_flusher_started = False
+
+
+def record_view(pk):
+    """
+    Учитывает просмотр статьи в памяти процесса. Накопленные просмотры
+    записываются в базу не чаще, чем раз в BLOG_VIEWS_FLUSH_INTERVAL секунд:
+    при очередном просмотре или фоновым потоком из start_flusher.
+    """
+    with _lock:
+        _pending[pk] += 1
+        flush_due = time.monotonic() - _flushed_at >= settings.BLOG_VIEWS_FLUSH_INTERVAL
+    if flush_due:
+        flush_views()
+
+
+def get_pending_views(pk):
+    """Просмотры статьи, еще не записанные в базу"""
+    with _lock:
+        return _pending.get(pk, 0)
+
+
+def flush_views():
+    """
+    Записывает накопленные просмотры одним UPDATE: F('views_count') + n, где n выбирается
+    через CASE по группам статей с одинаковым числом просмотров. При ошибке базы
+    просмотры возвращаются в буфер.
+    """
+    global _flushed_at
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _flushed_at = time.monotonic()
+
+    articles_by_count = defaultdict(list)
+    for pk, count in pending.items():
+        articles_by_count[count].append(pk)
+    if not pending:
+        return
+    added = Case(*(When(pk__in=pks, then=Value(count)) for count, pks in articles_by_count.items()),
+                 output_field=IntegerField())
+    try:
+        Blog.objects.filter(pk__in=pending).update(views_count=F('views_count') + added)
+    except DatabaseError:
+        with _lock:
+            _pending.update(pending)
+        raise
+
+
+def run_flusher():
+    """Раз в BLOG_VIEWS_FLUSH_INTERVAL секунд записывает просмотры, даже если новых запросов нет"""
+    while True:
+        time.sleep(max(settings.BLOG_VIEWS_FLUSH_INTERVAL, 1))
+        try:
+            flush_views()
+        except DatabaseError:
+            pass
+        finally:
+            connection.close()
+
+
+def start_flusher():
+    """
+    Запускает фоновый поток записи просмотров. Вызывается из wsgi.py и asgi.py,
+    после fork поток запускается заново в каждом рабочем процессе.
+    """
+    global _flusher_started
+    if _flusher_started:
+        return
+    _flusher_started = True
+    os.register_at_fork(after_in_child=_start_flusher_thread)
+    _start_flusher_thread()
+
+
+def _start_flusher_thread():
+    threading.Thread(target=run_flusher, name='blog-views-flusher', daemon=True).start()
+
+
+atexit.register(flush_views)
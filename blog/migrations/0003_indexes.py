@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:46
+
+from django.db import migrations, models
+
+from main.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('blog', '0002_alter_blog_creation_date'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='blog',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-creation_date'], name='blog_published_date_idx'),
+        ),
+    ]
@@ -18,3 +18,7 @@ class Blog(models.Model):
     class Meta:
         verbose_name = "блог"
         verbose_name_plural = "статьи"
+        indexes = [
+            models.Index(fields=('-creation_date',), condition=models.Q(is_published=True),
+                         name='blog_published_date_idx'),
+        ]
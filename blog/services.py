@@ -1,18 +1,54 @@
-from config import settings
+from random import sample
+
+from django.conf import settings
 from django.core.cache import cache
+from django.db.models.functions import Left
 from blog.models import Blog
+from main.cache import VERSIONED_TIMEOUT, make_key
+
+PREVIEW_LENGTH = 200
+# счетчик просмотров обновляется через update() без сигналов, поэтому карточки
+# живут не дольше закешированной главной страницы
+ARTICLE_CARD_TIMEOUT = 60
 
 
-def get_articles_cache():
-    """Создание кеширования"""
+def get_published_ids():
+    """Список id опубликованных статей, кешируется до изменения статей"""
     if settings.CACHE_ENABLED:
-        key = 'articles_list'
-        articles_list = cache.get(key)
-        if articles_list is None:
-            articles_list = Blog.objects.all()
-            cache.set(key, articles_list)
-        else:
-            return articles_list
+        key = make_key(('blog',), 'published_ids')
+        published_ids = cache.get(key)
+        if published_ids is None:
+            published_ids = list(Blog.objects.filter(is_published=True).values_list('pk', flat=True))
+            cache.set(key, published_ids, VERSIONED_TIMEOUT)
+        return published_ids
+    return list(Blog.objects.filter(is_published=True).values_list('pk', flat=True))
+
+
+def load_article_cards(ids):
+    """Карточки статей: заголовок, slug, изображение и начало текста вместо полного description"""
+    cards = Blog.objects.filter(pk__in=ids).annotate(
+        short_description=Left('description', PREVIEW_LENGTH),
+    ).values('pk', 'title', 'slug', 'preview', 'short_description', 'views_count', 'creation_date')
+    return {card['pk']: card for card in cards}
+
+
+def get_article_cards(ids):
+    """Карточки статей по id в том же порядке, недостающие в кеше загружаются одним запросом"""
+    if settings.CACHE_ENABLED:
+        keys = {pk: make_key(('blog',), 'article_card', pk) for pk in ids}
+        cached = cache.get_many(keys.values())
+        cards = {pk: cached[key] for pk, key in keys.items() if key in cached}
+        missing = [pk for pk in ids if pk not in cards]
+        if missing:
+            loaded = load_article_cards(missing)
+            cache.set_many({keys[pk]: card for pk, card in loaded.items()}, ARTICLE_CARD_TIMEOUT)
+            cards.update(loaded)
     else:
-        articles_list = Blog.objects.all()
-    return articles_list
+        cards = load_article_cards(ids)
+    return [cards[pk] for pk in ids if pk in cards]
+
+
+def get_random_articles(count):
+    """Случайные опубликованные статьи: выбираются count id из пула и загружаются только их карточки"""
+    published_ids = get_published_ids()
+    return get_article_cards(sample(published_ids, min(count, len(published_ids))))
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from blog.models import Blog
+from main.cache import bump_version
+
+
+@receiver(post_save, sender=Blog)
+@receiver(post_delete, sender=Blog)
+def reset_blog_cache(sender, **kwargs):
+    """Делает недействительными пул опубликованных статей, карточки и закешированные страницы блога"""
+    bump_version('blog')
@@ -1,3 +1,167 @@
-from django.test import TestCase
+import threading
+import time
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from blog.counters import flush_views, get_pending_views, record_view, run_flusher
+from blog.models import Blog
+from blog.services import ARTICLE_CARD_TIMEOUT, get_article_cards, get_random_articles
+from main.bench import generate_mailing_data
+from main.testing import ViewBudgetMixin, grow_mailing_data
+from users.models import User
+
+
+class BlogViewsCounterTestCase(TestCase):
+
+    def setUp(self):
+        self.article = Blog.objects.create(title='Статья', description='Текст')
+        self.addCleanup(flush_views)
+
+    @override_settings(BLOG_VIEWS_FLUSH_INTERVAL=3600)
+    def test_views_are_buffered_and_flushed_with_one_update(self):
+        flush_views()
+        url = reverse('blog:view', args=[self.article.pk])
+        for _ in range(5):
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+
+        self.assertEqual(response.context['object'].views_count, 5)
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views_count, 0)
+
+        with self.assertNumQueries(1):
+            flush_views()
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views_count, 5)
+
+    @override_settings(BLOG_VIEWS_FLUSH_INTERVAL=0)
+    def test_views_are_flushed_after_interval(self):
+        self.client.get(reverse('blog:view', args=[self.article.pk]))
+        self.client.get(reverse('blog:view', args=[self.article.pk]))
+
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views_count, 2)
+
+    @override_settings(BLOG_VIEWS_FLUSH_INTERVAL=3600)
+    def test_failed_flush_keeps_views(self):
+        other = Blog.objects.create(title='Другая статья', description='Текст')
+        flush_views()
+        for pk in (self.article.pk, self.article.pk, other.pk):
+            record_view(pk)
+
+        with patch('blog.counters.Blog.objects.filter', side_effect=DatabaseError), self.assertRaises(DatabaseError):
+            flush_views()
+
+        self.assertEqual(get_pending_views(self.article.pk), 2)
+        with self.assertNumQueries(1):
+            flush_views()
+        self.assertEqual(dict(Blog.objects.filter(pk__in=[self.article.pk, other.pk]).values_list('pk', 'views_count')),
+                         {self.article.pk: 2, other.pk: 1})
+
+    def test_flusher_writes_views_without_new_requests(self):
+        flushed = threading.Event()
+
+        def stop_after_flush():
+            flushed.set()
+            raise SystemExit
+
+        with patch('blog.counters.flush_views', side_effect=stop_after_flush), \
+                patch('blog.counters.time.sleep') as sleep:
+            thread = threading.Thread(target=run_flusher)
+            thread.start()
+            thread.join(5)
+
+        self.assertTrue(flushed.is_set())
+        sleep.assert_called_once_with(10)
+
+
+@override_settings(CACHE_ENABLED=True, CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ArticlePoolTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.articles = [Blog.objects.create(title=f'Статья {index}', description='Текст ' * 500)
+                         for index in range(10)]
+
+    def test_random_articles_are_published_cards(self):
+        Blog.objects.filter(pk__in=[article.pk for article in self.articles[3:]]).update(is_published=False)
+        cache.clear()
+
+        cards = get_random_articles(3)
+
+        self.assertEqual({card['pk'] for card in cards}, {article.pk for article in self.articles[:3]})
+        self.assertNotIn('description', cards[0])
+        self.assertEqual(len(cards[0]['short_description']), 200)
+
+    def test_pool_is_cached_and_invalidated_on_save(self):
+        get_random_articles(10)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(get_random_articles(3)), 3)
+
+        self.articles[0].is_published = False
+        self.articles[0].save()
+        cards = get_random_articles(10)
+
+        self.assertEqual(len(cards), 9)
+        self.assertNotIn(self.articles[0].pk, [card['pk'] for card in cards])
+
+        self.articles[1].delete()
+        self.assertEqual(len(get_random_articles(10)), 8)
+
+
+    def test_cards_expire_to_pick_up_views(self):
+        article = self.articles[0]
+        get_article_cards([article.pk])
+        Blog.objects.filter(pk=article.pk).update(views_count=7)
+
+        with patch('django.core.cache.backends.locmem.time.time', return_value=time.time() + ARTICLE_CARD_TIMEOUT + 1):
+            card, = get_article_cards([article.pk])
+
+        self.assertEqual(card['views_count'], 7)
+
+
+class BlogListTestCase(TestCase):
+
+    def test_list_is_paginated_without_article_text(self):
+        for index in range(15):
+            Blog.objects.create(title=f'Статья {index}', description='Текст ' * 500, is_published=True)
+
+        response = self.client.get(reverse('blog:list'))
+
+        self.assertEqual(len(response.context['object_list']), 12)
+        self.assertTrue(response.context['page_obj'].has_next())
+        self.assertIn('description', response.context['object_list'][0].get_deferred_fields())
+        self.assertEqual(len(self.client.get(reverse('blog:list') + '?page=2').context['object_list']), 3)
+
+
+@override_settings(CACHE_ENABLED=False)
+class BlogViewBudgetTestCase(ViewBudgetMixin, TestCase):
+    """Бюджеты запросов и времени ответа страниц блога"""
+    urlconf = 'blog.urls'
+
+    def setUp(self):
+        self.editor = User.objects.create(email='editor@localhost')
+        self.editor.groups.add(Group.objects.create(name='content_manager'))
+        self.owner, _, _ = generate_mailing_data(clients=3, mailings=2)
+        self.article = Blog.objects.create(title='Статья', description='Текст ' * 500)
+        self.addCleanup(flush_views)
+
+    def grow_data(self):
+        Blog.objects.bulk_create([Blog(title=f'Статья {index}', description='Текст ' * 500) for index in range(300)])
+        grow_mailing_data(self.owner)
+
+    def get_cases(self):
+        editor, pk = self.editor, self.article.pk
+        return {
+            'home_index': (None, reverse('blog:home_index'), 4),
+            'list': (None, reverse('blog:list'), 2),
+            'view': (None, reverse('blog:view', args=[pk]), 1),
+            'create': (editor, reverse('blog:create'), 3),
+            'edit': (editor, reverse('blog:edit', args=[pk]), 4),
+            'delete': (editor, reverse('blog:delete', args=[pk]), 4),
+        }
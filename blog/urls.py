@@ -1,5 +1,4 @@
 from django.urls import path
-from django.views.decorators.cache import cache_page
 
 from blog.apps import BlogConfig
 from blog.views import BlogCreateView, BlogListView, BlogDetailView, BlogUpdateView, BlogDelete, HomeIndex
@@ -12,5 +11,5 @@ urlpatterns = [
     path('view/<int:pk>/', BlogDetailView.as_view(), name='view'),
     path('edit/<int:pk>/', BlogUpdateView.as_view(), name='edit'),
     path('delete/<int:pk>/', BlogDelete.as_view(), name='delete'),
-    path('', cache_page(60)(HomeIndex), name='home_index'),
+    path('', HomeIndex, name='home_index'),
 ]
\ No newline at end of file
@@ -1,14 +1,15 @@
-from random import sample
-
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.shortcuts import render, redirect
 from django.urls import reverse_lazy, reverse
 from django.views.generic import CreateView, ListView, DetailView, UpdateView, DeleteView
 from pytils.translit import slugify
 
+from blog.counters import record_view, get_pending_views
 from blog.models import Blog
-from blog.services import get_articles_cache
-from main.models import Mailing
+from blog.services import get_random_articles
+from main.cache import cache_view
+from main.services import get_mailing_counts
+from users.roles import can_manage_blog
 
 
 class BlogCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
@@ -19,7 +20,7 @@ class BlogCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
 
     def test_func(self):
         user = self.request.user
-        if user.groups.filter(name='content_manager').exists() or user.is_superuser:
+        if can_manage_blog(user):
             return True
         return False
 
@@ -39,12 +40,13 @@ class BlogCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
 class BlogListView(ListView):
     """Контроллер блога для просмотра списка статей"""
     model = Blog
+    paginate_by = 12
 
     def get_queryset(self, *args, **kwargs):
-        """Выводим в общий список только опубликованные записи"""
+        """Выводим в общий список только опубликованные записи, без текста статей"""
 
         queryset = super().get_queryset(*args, **kwargs)
-        queryset = queryset.filter(is_published=True)
+        queryset = queryset.filter(is_published=True).only('title').order_by('-creation_date', '-pk')
 
         return queryset
 
@@ -56,9 +58,8 @@ class BlogDetailView(DetailView):
         """Создаем счетчик просмотров"""
 
         self.object = super().get_object(queryset)
-        self.object.views_count += 1
-        print(self.object.views_count)
-        self.object.save()
+        record_view(self.object.pk)
+        self.object.views_count += get_pending_views(self.object.pk)
 
         return self.object
 
@@ -78,7 +79,7 @@ class BlogUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
 
     def test_func(self):
         user = self.request.user
-        if user.groups.filter(name='content_manager').exists() or user.is_superuser:
+        if can_manage_blog(user):
             return True
         return False
 
@@ -94,7 +95,7 @@ class BlogDelete(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
 
     def test_func(self):
         user = self.request.user
-        if user.groups.filter(name='content_manager').exists() or user.is_superuser:
+        if can_manage_blog(user):
             return True
         return False
 
@@ -102,18 +103,10 @@ class BlogDelete(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
         return redirect(reverse_lazy('blog:list'))
 
 
+@cache_view('blog', 'mailing', timeout=60)
 def HomeIndex(request):
-    mailing_count = Mailing.objects.all().count()
-    active_count = Mailing.objects.filter(mailing_status=Mailing.STATUS_STARTED).count()
-    article_all = get_articles_cache()
-    count_article = len(article_all)
-    min_article = min(3, count_article)
-    article = sample(list(article_all), min_article)
     context = {
-        'mailing_count': mailing_count,
-        'active_count': active_count,
-        'article': article
+        **get_mailing_counts(),
+        'article': get_random_articles(3)
     }
     return render(request, 'blog/home_index.html', context)
-
-
@@ -85,6 +85,8 @@ DATABASES = {
         'NAME': config('DB_NAME'),
         'USER': 'postgres',
         'PASSWORD': config('DB_USER_PASSWORD'),
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -142,6 +144,31 @@ EMAIL_HOST_USER = config('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 EMAIL_USE_SSL = True
 
+EMAIL_POOL_SIZE = 4
+EMAIL_POOL_MAX_MESSAGES = 100
+EMAIL_POOL_MAX_AGE = 300
+EMAIL_RATE_LIMIT = 0
+EMAIL_RATE_BURST = 10
+
+MAILING_WORKERS = 4
+MAILING_LOG_BATCH_SIZE = 500
+MAILING_LOG_FLUSH_INTERVAL = 5
+SCHEDULER_MAX_SLEEP = 60
+MAILING_CLAIM_BATCH_SIZE = 5000
+MAILING_DISPATCH_CHUNK_SIZE = 40
+MAILING_LEASE_TTL = 600
+MAILING_RETRY_MAX_ATTEMPTS = 5
+MAILING_RETRY_BASE_DELAY = 60
+MAILING_RETRY_MAX_DELAY = 3600
+MAILING_LOG_RETENTION_DAYS = 90
+
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_LEASE_TTL = 300
+OUTBOX_POLL_INTERVAL = 2
+
+BLOG_VIEWS_FLUSH_INTERVAL = 10
+
 
 AUTH_USER_MODEL = 'users.User'
 LOGOUT_REDIRECT_URL = '/'
@@ -154,6 +181,14 @@ CACHE_ENABLED = config('CACHE_ENABLED') == '1'
 if CACHE_ENABLED:
     CACHES = {
         'default': {
+            'BACKEND': 'main.cache_backends.TieredCache',
+            'OPTIONS': {
+                'L2': 'shared',
+                'L1_TIMEOUT': 5,
+                'L1_MAX_ENTRIES': 1000,
+            }
+        },
+        'shared': {
             'BACKEND': 'django.core.cache.backends.redis.RedisCache',
             'LOCATION': 'redis://127.0.0.1:6379'
         }
@@ -1,26 +1,59 @@
 from django.contrib import admin
-from .models import Client, Mailing, MailingLog
+from django.db.models import Count
+
+from .models import Client, Mailing, MailingLog, MailingLogRollup, SubscriptionState
+from .pagination import EstimatedCountPaginator
 
 
 @admin.register(Client)
 class ClientAdmin(admin.ModelAdmin):
-    list_display = ('email', 'first_name', 'last_name', 'surname', 'comment')
-    search_fields = ('email',)
+    list_display = ('email', 'first_name', 'last_name', 'surname', 'client_owner', 'comment')
+    list_select_related = ('client_owner',)
+    search_fields = ('^email',)
+    raw_id_fields = ('client_owner',)
 
 
 @admin.register(Mailing)
 class MailingAdmin(admin.ModelAdmin):
-    list_display = ('send_time', 'send_frequency', 'mailing_status', 'display_mailing_clients', 'subject', 'body')
-    search_fields = ('send_frequency', 'mailing_status', 'mailing_clients')
-
+    list_display = ('subject', 'send_time', 'send_frequency', 'mailing_status', 'mailing_owner',
+                    'display_mailing_clients')
+    list_select_related = ('mailing_owner',)
+    list_filter = ('mailing_status', 'send_frequency')
+    search_fields = ('^subject', '^mailing_owner__email')
+    raw_id_fields = ('mailing_owner',)
+    autocomplete_fields = ('mailing_clients',)
+
+    def get_queryset(self, request):
+        """Число подписчиков считается в том же запросе, текст письма в списке не нужен"""
+        return super().get_queryset(request).defer('body').annotate(clients_count=Count('mailing_clients'))
+
+    @admin.display(description='подписчиков', ordering='clients_count')
     def display_mailing_clients(self, obj):
-        return ', '.join([client.email for client in obj.mailing_clients.all()])
-
-    display_mailing_clients.short_description = 'Mailing Clients'
+        return obj.clients_count
 
 
 @admin.register(MailingLog)
 class MailingLogAdmin(admin.ModelAdmin):
-    list_display = ('created_time', 'log_status', 'log_client', 'log_mailing', 'response')
-    search_fields = ('log_status', 'log_client', 'log_mailing')
-
+    list_display = ('created_time', 'log_status', 'log_client', 'log_mailing')
+    list_select_related = ('log_client', 'log_mailing')
+    # вместо date_hierarchy, которая собирает даты по всей таблице, фиксированные
+    # диапазоны DateFieldListFilter: они читаются по main_log_created_idx
+    list_filter = ('log_status', 'created_time')
+    search_fields = ('^log_client__email',)
+    raw_id_fields = ('log_client', 'log_mailing')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(MailingLogRollup)
+class MailingLogRollupAdmin(admin.ModelAdmin):
+    list_display = ('date', 'log_mailing', 'log_client', 'ok_count', 'failed_count')
+    list_select_related = ('log_mailing', 'log_client')
+    raw_id_fields = ('log_mailing', 'log_client')
+
+
+@admin.register(SubscriptionState)
+class SubscriptionStateAdmin(admin.ModelAdmin):
+    list_display = ('mailing', 'client', 'last_sent_at', 'next_send_at', 'attempts', 'last_status')
+    list_select_related = ('mailing', 'client')
+    raw_id_fields = ('mailing', 'client')
@@ -0,0 +1,109 @@
+import datetime
+import resource
+import statistics
+import time
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from main.models import Client, Mailing
+from main.send_mailing import MailingDispatcher, send_mails
+from main.services import create_subscription_states
+from main.smtp import close_connection_pool
+from main.smtp_sink import SMTPSink
+from users.models import User
+
+
+class TimedDispatcher(MailingDispatcher):
+    """Диспетчер, запоминающий длительность каждой отправки"""
+
+    def __init__(self):
+        super().__init__()
+        self.durations = []
+
+    def deliver(self, mailing, mailing_client):
+        started = time.perf_counter()
+        result = super().deliver(mailing, mailing_client)
+        self.durations.append(time.perf_counter() - started)
+        return result
+
+
+def generate_mailing_data(clients, mailings, owner_email='bench@localhost'):
+    """Создает владельца, clients подписчиков и mailings запущенных рассылок на всех подписчиков"""
+    owner, _ = User.objects.get_or_create(email=owner_email)
+    # почта клиента уникальна у владельца, поэтому повторный вызов продолжает нумерацию
+    start = Client.objects.filter(client_owner=owner).count()
+    client_objects = Client.objects.bulk_create(
+        [Client(email=f'client{index}@bench.localhost', client_owner=owner) for index in range(start, start + clients)],
+        batch_size=1000,
+    )
+    mailing_objects = Mailing.objects.bulk_create([
+        Mailing(
+            send_time=datetime.time(10, 0),
+            send_frequency=Mailing.PERIOD_DAILY,
+            mailing_status=Mailing.STATUS_STARTED,
+            subject=f'Рассылка {index}',
+            body='Текст тестовой рассылки',
+            mailing_owner=owner,
+        )
+        for index in range(mailings)
+    ])
+    Subscription = Mailing.mailing_clients.through
+    pairs = [(mailing.pk, client.pk) for mailing in mailing_objects for client in client_objects]
+    Subscription.objects.bulk_create(
+        [Subscription(mailing_id=mailing_id, client_id=client_id) for mailing_id, client_id in pairs],
+        batch_size=1000,
+    )
+    create_subscription_states(pairs)
+    return owner, mailing_objects, client_objects
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_dispatch_benchmark(clients, mailings, workers=None, delay=0.0, keep_data=False):
+    """
+    Замер send_mails на локальном SMTP-сервере.
+
+    Тестовые данные создаются в транзакции, которая по окончании
+    откатывается, если не указан keep_data. Отправляются только созданные
+    рассылки, настоящие подписчики в базе не затрагиваются.
+    """
+    with SMTPSink(delay=delay) as sink, override_settings(
+        EMAIL_HOST=sink.server_address[0],
+        EMAIL_PORT=sink.port,
+        EMAIL_USE_SSL=False,
+        EMAIL_HOST_USER='bench@localhost',
+        EMAIL_HOST_PASSWORD='bench',
+        EMAIL_RATE_LIMIT=0,
+    ):
+        close_connection_pool()
+        try:
+            with transaction.atomic():
+                _, mailing_objects, _ = generate_mailing_data(clients, mailings)
+                dispatcher = TimedDispatcher()
+                started = time.perf_counter()
+                with CaptureQueriesContext(connection) as queries:
+                    send_mails(workers=workers, dispatcher=dispatcher,
+                               mailing_ids=[mailing.pk for mailing in mailing_objects])
+                elapsed = time.perf_counter() - started
+                if not keep_data:
+                    transaction.set_rollback(True)
+        finally:
+            close_connection_pool()
+
+    return {
+        'messages': sink.message_count,
+        'connections': sink.connection_count,
+        'elapsed': elapsed,
+        'messages_per_second': sink.message_count / elapsed if elapsed else 0.0,
+        'latency_p50': percentile(dispatcher.durations, 0.5),
+        'latency_p99': percentile(dispatcher.durations, 0.99),
+        'latency_mean': statistics.fmean(dispatcher.durations) if dispatcher.durations else 0.0,
+        'queries': len(queries),
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
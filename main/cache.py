@@ -0,0 +1,125 @@
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'cache_version:{}'
+LOCK_KEY = 'cache_lock:{}'
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 5
+LOCK_POLL_INTERVAL = 0.05
+# после смены версии старые ключи никто не удаляет, поэтому они должны истекать сами
+VERSIONED_TIMEOUT = 24 * 60 * 60
+MISSING = object()
+
+
+def new_version():
+    return time.time_ns()
+
+
+def get_versions(namespaces):
+    """Текущие версии пространств имен кеша; версия создается при первом обращении"""
+    keys = {namespace: VERSION_KEY.format(namespace) for namespace in namespaces}
+    stored = cache.get_many(keys.values())
+    versions = {}
+    for namespace, key in keys.items():
+        if key not in stored:
+            cache.add(key, new_version(), None)
+            stored[key] = cache.get(key)
+        versions[namespace] = stored[key]
+    return versions
+
+
+def bump_version(*namespaces):
+    """Делает недействительными все ключи пространств имен, меняя их версию"""
+    cache.set_many({VERSION_KEY.format(namespace): new_version() for namespace in namespaces}, None)
+
+
+def make_key(namespaces, *parts):
+    """Ключ кеша, включающий версии всех пространств имен, от которых зависит значение"""
+    versions = get_versions(namespaces)
+    stamp = '.'.join(f'{namespace}{versions[namespace]}' for namespace in namespaces)
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'{stamp}:{digest}'
+
+
+def get_or_compute(key, compute, timeout=VERSIONED_TIMEOUT, cacheable=None):
+    """
+    Значение ключа или результат compute(). При промахе значение вычисляет
+    только тот, кто первым взял блокировку в общем кеше, остальные ждут его
+    результата до LOCK_WAIT секунд и лишь затем вычисляют сами.
+    Результат сохраняется, только если cacheable(value) истинно.
+    """
+    value = cache.get(key, MISSING)
+    if value is not MISSING:
+        return value
+    lock_key = LOCK_KEY.format(key)
+    deadline = time.monotonic() + LOCK_WAIT
+    while not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            return compute()
+        time.sleep(LOCK_POLL_INTERVAL)
+        value = cache.get(key, MISSING)
+        if value is not MISSING:
+            return value
+    try:
+        value = cache.get(key, MISSING)
+        if value is MISSING:
+            value = compute()
+            if cacheable is None or cacheable(value):
+                cache.set(key, value, timeout)
+        return value
+    finally:
+        cache.delete(lock_key)
+
+
+def cached(*namespaces, timeout=VERSIONED_TIMEOUT):
+    """
+    Кеширует результат функции до изменения данных пространств имен namespaces,
+    но не дольше timeout секунд.
+    Ключ строится из имени функции и repr ее аргументов.
+    """
+    def decorator(func):
+        name = f'{func.__module__}.{func.__qualname__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not settings.CACHE_ENABLED:
+                return func(*args, **kwargs)
+            key = make_key(namespaces, name, args, sorted(kwargs.items()))
+            return get_or_compute(key, functools.partial(func, *args, **kwargs), timeout)
+        return wrapper
+    return decorator
+
+
+def render_view(view, request, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    if hasattr(response, 'render') and callable(response.render):
+        response.render()
+    return response
+
+
+def is_cacheable_response(response):
+    return response.status_code == 200 and not response.streaming
+
+
+def cache_view(*namespaces, timeout=VERSIONED_TIMEOUT):
+    """
+    Кеширует успешные GET-ответы функции-представления до изменения данных
+    пространств имен namespaces. Ответы кешируются отдельно для каждого
+    пользователя, потому что шаблоны показывают разное меню.
+    """
+    def decorator(view):
+        name = f'{view.__module__}.{view.__qualname__}'
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not settings.CACHE_ENABLED or request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            key = make_key(namespaces, name, request.get_full_path(), request.user.pk)
+            return get_or_compute(key, functools.partial(render_view, view, request, *args, **kwargs),
+                                  timeout, cacheable=is_cacheable_response)
+        return wrapper
+    return decorator
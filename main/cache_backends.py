@@ -0,0 +1,168 @@
+import pickle
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+class TieredCache(BaseCache):
+    """
+    Двухуровневый кеш.
+
+    L1 - LRU-словарь в памяти процесса с коротким временем жизни записей,
+    L2 - общий кеш из настройки CACHES (Redis или локальная замена), имя
+    которого задается параметром OPTIONS['L2']. Чтение идет сначала в L1,
+    запись и удаление - в оба уровня. Изменения, сделанные другими процессами,
+    становятся видны не позже чем через L1_TIMEOUT секунд.
+
+    Пример настройки:
+        'default': {
+            'BACKEND': 'main.cache_backends.TieredCache',
+            'OPTIONS': {'L2': 'shared', 'L1_TIMEOUT': 5, 'L1_MAX_ENTRIES': 1000},
+        }
+    """
+
+    def __init__(self, location, params):
+        options = dict(params.get('OPTIONS', {}))
+        self._l2_alias = options.pop('L2')
+        self.l1_timeout = options.pop('L1_TIMEOUT', 5)
+        self.l1_max_entries = options.pop('L1_MAX_ENTRIES', 1000)
+        super().__init__({**params, 'OPTIONS': options})
+        self._l1 = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    def get_stats(self):
+        """Число попаданий и промахов по уровням кеша в этом процессе"""
+        with self._lock:
+            return {name: self.stats[name] for name in ('l1_hits', 'l1_misses', 'l2_hits', 'l2_misses')}
+
+    def _l1_key(self, key, version):
+        return self.make_and_validate_key(key, version=version)
+
+    def _l1_get(self, l1_key):
+        with self._lock:
+            entry = self._l1.get(l1_key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._l1.move_to_end(l1_key)
+                self.stats['l1_hits'] += 1
+                return pickle.loads(entry[1])
+            if entry is not None:
+                del self._l1[l1_key]
+            self.stats['l1_misses'] += 1
+            raise KeyError(l1_key)
+
+    def _l1_set(self, l1_key, value, timeout):
+        # Значения хранятся сериализованными, чтобы вызывающий код не мог
+        # изменить закешированный объект, например заголовки HttpResponse
+        lifetime = self.l1_timeout if timeout is None else min(timeout, self.l1_timeout)
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._l1[l1_key] = (time.monotonic() + lifetime, pickled)
+            self._l1.move_to_end(l1_key)
+            while len(self._l1) > self.l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, *l1_keys):
+        with self._lock:
+            for l1_key in l1_keys:
+                self._l1.pop(l1_key, None)
+
+    def _count_l2(self, hits, misses):
+        with self._lock:
+            self.stats['l2_hits'] += hits
+            self.stats['l2_misses'] += misses
+
+    def get(self, key, default=None, version=None):
+        l1_key = self._l1_key(key, version)
+        try:
+            return self._l1_get(l1_key)
+        except KeyError:
+            pass
+        value = self.l2.get(key, self, version=version)
+        if value is self:
+            self._count_l2(0, 1)
+            return default
+        self._count_l2(1, 0)
+        self._l1_set(l1_key, value, None)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        missing = []
+        for key in keys:
+            try:
+                found[key] = self._l1_get(self._l1_key(key, version))
+            except KeyError:
+                missing.append(key)
+        if missing:
+            loaded = self.l2.get_many(missing, version=version)
+            self._count_l2(len(loaded), len(missing) - len(loaded))
+            for key, value in loaded.items():
+                self._l1_set(self._l1_key(key, version), value, None)
+            found.update(loaded)
+        return found
+
+    def _resolve_timeout(self, timeout):
+        # L2 сам переводит относительный таймаут в срок хранения, а
+        # get_backend_timeout() вернул бы абсолютное время
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._resolve_timeout(timeout)
+        self.l2.set(key, value, timeout, version=version)
+        self._l1_set(self._l1_key(key, version), value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._resolve_timeout(timeout)
+        failed = self.l2.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if key not in failed:
+                self._l1_set(self._l1_key(key, version), value, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # add должен быть атомарным между процессами, поэтому решает только L2
+        timeout = self._resolve_timeout(timeout)
+        added = self.l2.add(key, value, timeout, version=version)
+        if added:
+            self._l1_set(self._l1_key(key, version), value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._l1_delete(self._l1_key(key, version))
+        return self.l2.touch(key, self._resolve_timeout(timeout), version=version)
+
+    def delete(self, key, version=None):
+        self._l1_delete(self._l1_key(key, version))
+        return self.l2.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        self._l1_delete(*(self._l1_key(key, version) for key in keys))
+        self.l2.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, self, version=version) is not self
+
+    def incr(self, key, delta=1, version=None):
+        self._l1_delete(self._l1_key(key, version))
+        return self.l2.incr(key, delta, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+        self.l2.clear()
+
+    def clear_local(self):
+        """Очищает только L1 этого процесса"""
+        with self._lock:
+            self._l1.clear()
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
@@ -1,5 +1,7 @@
 from django import forms
+from django.urls import reverse
 
+from main.importer import IMPORT_FORMATS
 from main.models import Mailing, Client
 
 
@@ -10,22 +12,126 @@ class VisualMixin:
             field.widget.attrs['class'] = 'form-control'
 
 
+class ClientSearchWidget(forms.SelectMultiple):
+    """
+    Список клиентов, которых нужно добавить в рассылку или убрать из нее.
+    Выводятся только выбранные сейчас клиенты, варианты подгружаются скриптом
+    из search_url по мере ввода.
+    """
+
+    class Media:
+        js = ('js/client_search.js',)
+
+    def __init__(self, attrs=None, search_url=''):
+        super().__init__(attrs)
+        self.search_url = search_url
+        self.queryset = Client.objects.none()
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-client-picker'] = name
+        if self.search_url:
+            context['widget']['attrs']['data-search-url'] = self.search_url
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        selected_ids = [pk for pk in value if str(pk).isdigit()]
+        clients = self.queryset.filter(pk__in=selected_ids).only('email', 'first_name', 'last_name') if selected_ids else []
+        options = [
+            self.create_option(name, str(client.pk), str(client), True, index)
+            for index, client in enumerate(clients)
+        ]
+        return [(None, options, 0)]
+
+
+class ClientIdsField(forms.Field):
+    """Список id клиентов, принадлежность владельцу проверяет форма рассылки"""
+    widget = ClientSearchWidget
+
+    def to_python(self, value):
+        if not value:
+            return []
+        try:
+            return sorted({int(pk) for pk in value})
+        except (TypeError, ValueError):
+            raise forms.ValidationError('Некорректный список клиентов', code='invalid')
+
+
 class MailingForm(VisualMixin, forms.ModelForm):
+    """
+    Форма рассылки. Подписчиков у рассылки могут быть десятки тысяч, поэтому форма
+    не выводит их, а принимает только списки клиентов, которых нужно добавить и убрать.
+    """
+    add_clients = ClientIdsField(label='добавить подписчиков', required=False)
+    remove_clients = ClientIdsField(label='убрать подписчиков', required=False)
 
     def __init__(self, user, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        if user.is_staff:
-            mailing_owner = self.instance.mailing_owner
-            self.fields['mailing_clients'].queryset = Client.objects.filter(client_owner=mailing_owner)
+        search_url = reverse('main:client_search')
+        if self.instance.pk:
+            search_url += f'?mailing={self.instance.pk}'
+            self.subscribers_count = self.instance.mailing_clients.count()
+        else:
+            del self.fields['remove_clients']
+            self.subscribers_count = 0
+        if user.is_staff and self.instance.pk:
+            self.owner_id = self.instance.mailing_owner_id
         else:
-            self.fields['mailing_clients'].queryset = Client.objects.filter(client_owner=user)
+            self.owner_id = user.pk
+        clients = Client.objects.filter(client_owner=self.owner_id)
+        for name in ('add_clients', 'remove_clients'):
+            if name in self.fields:
+                self.fields[name].widget.queryset = clients
+        self.fields['add_clients'].widget.search_url = search_url
+
+    def clean(self):
+        """Все выбранные клиенты проверяются одним запросом"""
+        cleaned_data = super().clean()
+        ids = set(cleaned_data.get('add_clients', [])) | set(cleaned_data.get('remove_clients', []))
+        if ids and Client.objects.filter(client_owner=self.owner_id, pk__in=ids).count() != len(ids):
+            raise forms.ValidationError('Можно выбрать только своих клиентов')
+        return cleaned_data
+
+    def save(self, commit=True):
+        mailing = super().save(commit)
+        if commit:
+            self.save_subscribers()
+        return mailing
+
+    def save_subscribers(self):
+        """Добавляет и убирает выбранных клиентов, остальные подписчики не затрагиваются"""
+        if self.cleaned_data.get('add_clients'):
+            self.instance.mailing_clients.add(*self.cleaned_data['add_clients'])
+        if self.cleaned_data.get('remove_clients'):
+            self.instance.mailing_clients.remove(*self.cleaned_data['remove_clients'])
 
     class Meta:
         model = Mailing
-        exclude = ('mailing_owner',)
+        exclude = ('mailing_owner', 'mailing_clients')
 
 
 class ClientForm(VisualMixin, forms.ModelForm):
+
+    def clean_email(self):
+        """Почта хранится в нижнем регистре, как и при импорте, и не повторяется у владельца"""
+        email = self.cleaned_data['email'].lower()
+        owner_id = self.instance.client_owner_id
+        if owner_id is not None and Client.objects.filter(client_owner=owner_id, email=email).exclude(
+                pk=self.instance.pk).exists():
+            raise forms.ValidationError('Клиент с такой почтой уже есть')
+        return email
+
     class Meta:
         model = Client
-        exclude = ('client_owner',)
\ No newline at end of file
+        exclude = ('client_owner',)
+
+
+class ClientImportForm(VisualMixin, forms.Form):
+    file = forms.FileField(label='файл', help_text='CSV с заголовком email,first_name,last_name,surname,comment '
+                                                   'или JSON Lines с теми же полями')
+    import_format = forms.ChoiceField(label='формат', choices=[(value, value.upper()) for value in IMPORT_FORMATS])
+    mailing = forms.ModelChoiceField(label='подписать на рассылку', queryset=Mailing.objects.none(), required=False)
+
+    def __init__(self, user, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['mailing'].queryset = Mailing.objects.filter(mailing_owner=user)
@@ -0,0 +1,117 @@
+import csv
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+
+from main.models import Client, Mailing
+from main.services import create_subscription_states
+
+CLIENT_FIELDS = ('email', 'first_name', 'last_name', 'surname', 'comment')
+IMPORT_FORMATS = ('csv', 'jsonl')
+
+
+class ImportResult:
+    """Итог импорта клиентов"""
+
+    def __init__(self):
+        self.processed = 0
+        self.created = 0
+        self.duplicates = 0
+        self.subscribed = 0
+        self.rejected = []
+
+    def reject(self, line, value, reason):
+        self.rejected.append((line, value, reason))
+
+
+def iter_rows(stream, import_format):
+    """
+    Построчно читает текстовый поток CSV с заголовком или JSON Lines
+    и выдает пары (номер строки, словарь полей или None для нечитаемой строки).
+    """
+    if import_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif import_format == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f'Неизвестный формат импорта: {import_format}')
+
+
+def import_clients(owner, stream, import_format='csv', mailing=None, batch_size=1000, progress=None):
+    """
+    Потоковый импорт клиентов владельца owner.
+
+    Почта приводится к нижнему регистру, повторы внутри файла и уже
+    существующие клиенты владельца не создаются заново. Клиенты вставляются
+    пачками по batch_size через bulk_create и, если указана рассылка mailing,
+    подписываются на нее напрямую через промежуточную таблицу.
+    После каждой пачки вызывается progress(result).
+    """
+    result = ImportResult()
+    seen = set()
+    batch = []
+
+    for line, row in iter_rows(stream, import_format):
+        result.processed += 1
+        if row is None:
+            result.reject(line, '', 'строку не удалось разобрать')
+            continue
+        email = str(row.get('email') or '').strip().lower()
+        try:
+            validate_email(email)
+        except ValidationError:
+            result.reject(line, email, 'некорректный адрес почты')
+            continue
+        if email in seen:
+            result.duplicates += 1
+            continue
+        seen.add(email)
+        details = {field: str(row.get(field) or '').strip() or None for field in CLIENT_FIELDS[1:]}
+        batch.append(Client(client_owner=owner, email=email, **details))
+        if len(batch) >= batch_size:
+            save_batch(owner, batch, mailing, result)
+            batch = []
+            if progress is not None:
+                progress(result)
+
+    if batch:
+        save_batch(owner, batch, mailing, result)
+    if progress is not None:
+        progress(result)
+    return result
+
+
+def save_batch(owner, batch, mailing, result):
+    """
+    Сохраняет пачку клиентов и подписывает их на рассылку. Почта хранится в нижнем
+    регистре, а пару (владелец, почта) защищает уникальное ограничение, поэтому
+    клиентов, добавленных параллельным импортом, bulk_create пропустит.
+    """
+    emails = [client.email for client in batch]
+    owner_clients = Client.objects.filter(client_owner=owner, email__in=emails)
+    existing = set(owner_clients.values_list('email', flat=True))
+    new_clients = [client for client in batch if client.email not in existing]
+    Client.objects.bulk_create(new_clients, ignore_conflicts=True)
+    result.created += len(new_clients)
+    result.duplicates += len(existing)
+
+    if mailing is not None:
+        client_ids = owner_clients.values_list('pk', flat=True)
+        pairs = [(mailing.pk, client_id) for client_id in client_ids]
+        Subscription = Mailing.mailing_clients.through
+        Subscription.objects.bulk_create(
+            [Subscription(mailing_id=mailing_id, client_id=client_id) for mailing_id, client_id in pairs],
+            ignore_conflicts=True,
+        )
+        create_subscription_states(pairs)
+        result.subscribed += len(pairs)
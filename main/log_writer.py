@@ -0,0 +1,98 @@
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from main.models import MAILING_TIMEZONE, MailingLog, SubscriptionState
+from main.services import add_mailing_stats, get_retry_delay
+
+
+class MailingLogWriter:
+    """
+    Буферизованная запись логов рассылки.
+
+    Результаты попыток копятся в памяти и сохраняются через bulk_create
+    вместе с обновлением состояний подписок и дневной статистики рассылок,
+    когда набирается batch_size записей или проходит flush_interval секунд.
+    При выходе из контекста, в том числе по ошибке, буфер сбрасывается в базу.
+    Состояние подписки записывается, только если ее аренда не перешла к другому
+    обработчику, иначе его результат затер бы более новый.
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None):
+        self.batch_size = batch_size or settings.MAILING_LOG_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.MAILING_LOG_FLUSH_INTERVAL
+        self._buffer = []
+        self._states = []
+        self._stats = {}
+        self._flushed_at = time.monotonic()
+
+    def add(self, subscription, status, response, temporary=False):
+        """Запоминает результат попытки и сбрасывает буфер, если он заполнен или устарел"""
+        self.record(subscription, status, response, temporary)
+        if len(self._buffer) >= self.batch_size or time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def record(self, subscription, status, response, temporary=False):
+        """
+        Запоминает результат попытки без записи в базу. Временная ошибка переносит следующую
+        попытку на время повтора, пока не исчерпан MAILING_RETRY_MAX_ATTEMPTS,
+        иначе подписка ждет следующего периода рассылки.
+        """
+        now = timezone.now()
+        self._states.append((subscription, subscription.lease_owner))
+        subscription.last_sent_at = now
+        if temporary and subscription.retries < settings.MAILING_RETRY_MAX_ATTEMPTS:
+            subscription.retries += 1
+            subscription.next_send_at = now + get_retry_delay(subscription.retries)
+        else:
+            subscription.retries = 0
+            subscription.next_send_at = subscription.mailing.get_next_send_at(now)
+        subscription.attempts += 1
+        subscription.last_status = status
+        subscription.leased_until = None
+        subscription.lease_owner = None
+        today = now.astimezone(MAILING_TIMEZONE).date()
+        key = (subscription.mailing_id, subscription.mailing.mailing_owner_id, today)
+        sent, failed = self._stats.get(key, (0, 0))
+        if status == MailingLog.STATUS_OK:
+            sent += 1
+        else:
+            failed += 1
+        self._stats[key] = (sent, failed)
+        self._buffer.append(MailingLog(
+            log_status=status,
+            log_client=subscription.client,
+            log_mailing=subscription.mailing,
+            response=response
+        ))
+
+    def get_owned_states(self):
+        """Состояния подписок, которые все еще арендованы тем же обработчиком, строки блокируются до записи"""
+        current = dict(SubscriptionState.objects.select_for_update().filter(
+            pk__in=[state.pk for state, lease_owner in self._states],
+        ).values_list('pk', 'lease_owner'))
+        return [state for state, lease_owner in self._states if current.get(state.pk) == lease_owner]
+
+    def flush(self):
+        if self._buffer:
+            with transaction.atomic():
+                MailingLog.objects.bulk_create(self._buffer, batch_size=self.batch_size)
+                SubscriptionState.objects.bulk_update(
+                    self.get_owned_states(),
+                    ['last_sent_at', 'next_send_at', 'attempts', 'retries', 'last_status', 'leased_until',
+                     'lease_owner'],
+                    batch_size=self.batch_size,
+                )
+                add_mailing_stats(self._stats)
+            self._buffer = []
+            self._states = []
+            self._stats = {}
+        self._flushed_at = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
@@ -0,0 +1,34 @@
+from django.core.management import BaseCommand
+
+from main.bench import run_dispatch_benchmark
+
+
+class Command(BaseCommand):
+    """
+    Замер скорости отправки рассылок: поднимает локальный SMTP-сервер,
+    создает clients подписчиков и mailings рассылок и прогоняет send_mails.
+    """
+    help = 'Замер пропускной способности отправки рассылок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=1000, help='число подписчиков')
+        parser.add_argument('--mailings', type=int, default=1, help='число рассылок')
+        parser.add_argument('--workers', type=int, default=None, help='число потоков отправки')
+        parser.add_argument('--delay', type=float, default=0.0, help='задержка ответа SMTP-сервера в секундах')
+        parser.add_argument('--keep-data', action='store_true', help='не удалять созданные данные')
+
+    def handle(self, *args, **options):
+        result = run_dispatch_benchmark(
+            clients=options['clients'],
+            mailings=options['mailings'],
+            workers=options['workers'],
+            delay=options['delay'],
+            keep_data=options['keep_data'],
+        )
+        self.stdout.write(f"Отправлено писем: {result['messages']} за {result['elapsed']:.3f} с")
+        self.stdout.write(f"Скорость: {result['messages_per_second']:.1f} msg/s")
+        self.stdout.write(f"Задержка отправки: p50 {result['latency_p50'] * 1000:.2f} мс, "
+                          f"p99 {result['latency_p99'] * 1000:.2f} мс")
+        self.stdout.write(f"SMTP-соединений: {result['connections']}")
+        self.stdout.write(f"Запросов к БД: {result['queries']}")
+        self.stdout.write(f"Пиковый RSS: {result['peak_rss_kb'] / 1024:.1f} МБ")
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from main.services import compact_logs
+
+
+class Command(BaseCommand):
+    """
+    Сворачивает логи рассылок старше --days дней в дневные счетчики
+    по рассылке и подписчику и удаляет детальные записи.
+    """
+    help = 'Сжатие старых логов рассылок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.MAILING_LOG_RETENTION_DAYS,
+                            help='сколько дней хранить детальные логи')
+
+    def handle(self, *args, **options):
+        deleted = compact_logs(options['days'])
+        self.stdout.write(f'Свернуто записей лога: {deleted}')
@@ -0,0 +1,51 @@
+from django.core.management import BaseCommand, CommandError
+
+from main.importer import IMPORT_FORMATS, import_clients
+from main.models import Mailing
+from users.models import User
+
+
+class Command(BaseCommand):
+    """Импорт клиентов из CSV или JSON Lines с необязательной подпиской на рассылку"""
+    help = 'Массовый импорт клиентов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='путь к файлу')
+        parser.add_argument('--owner', required=True, help='почта владельца клиентов')
+        parser.add_argument('--format', dest='import_format', choices=IMPORT_FORMATS, default=None,
+                            help='формат файла, по умолчанию определяется по расширению')
+        parser.add_argument('--mailing', type=int, default=None, help='id рассылки для подписки клиентов')
+        parser.add_argument('--batch-size', type=int, default=1000, help='размер пачки вставки')
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(email=options['owner'])
+        except User.DoesNotExist:
+            raise CommandError(f"Пользователь {options['owner']} не найден")
+
+        mailing = None
+        if options['mailing'] is not None:
+            try:
+                mailing = Mailing.objects.get(pk=options['mailing'], mailing_owner=owner)
+            except Mailing.DoesNotExist:
+                raise CommandError(f"Рассылка {options['mailing']} пользователя {owner.email} не найдена")
+
+        import_format = options['import_format'] or ('jsonl' if options['path'].endswith('.jsonl') else 'csv')
+        with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+            result = import_clients(
+                owner=owner,
+                stream=stream,
+                import_format=import_format,
+                mailing=mailing,
+                batch_size=options['batch_size'],
+                progress=lambda progress: self.stdout.write(
+                    f'Обработано строк: {progress.processed}, добавлено: {progress.created}'
+                ),
+            )
+
+        for line, value, reason in result.rejected:
+            self.stderr.write(f'Строка {line}: {value} - {reason}')
+        self.stdout.write(
+            f'Готово: добавлено {result.created}, повторов {result.duplicates}, '
+            f'подписано {result.subscribed}, отклонено {len(result.rejected)}'
+        )
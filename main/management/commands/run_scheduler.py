@@ -0,0 +1,70 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+
+from main.send_mailing import send_mails, get_next_send_at
+from main.smtp import close_connection_pool
+
+
+class Command(BaseCommand):
+    """
+    Планировщик рассылок.
+
+    Работает постоянно, сохраняя соединения с базой и SMTP-сервером между
+    запусками, и просыпается к ближайшему next_send_at среди запущенных
+    рассылок, но не реже чем раз в --max-sleep секунд. С --once выполняет
+    один проход и завершается, как запуск из crontab. С --shard i/N
+    обрабатывает только рассылки, у которых id % N == i.
+    """
+    help = 'Запуск планировщика рассылок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='выполнить одну отправку и завершиться')
+        parser.add_argument('--workers', type=int, default=None, help='число потоков отправки')
+        parser.add_argument('--max-sleep', type=float, default=settings.SCHEDULER_MAX_SLEEP,
+                            help='максимальная пауза между проходами в секундах')
+        parser.add_argument('--shard', default=None, help='номер шарда и число шардов в виде i/N')
+
+    def handle(self, *args, **options):
+        shard = self._parse_shard(options['shard'])
+        if options['once']:
+            send_mails(workers=options['workers'], shard=shard)
+            return
+
+        self._stop = threading.Event()
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        try:
+            while not self._stop.is_set():
+                close_old_connections()
+                send_mails(workers=options['workers'], shard=shard)
+                self._stop.wait(self._get_sleep(options['max_sleep'], shard))
+        finally:
+            close_connection_pool()
+        self.stdout.write('Планировщик остановлен')
+
+    @staticmethod
+    def _parse_shard(value):
+        if value is None:
+            return None
+        try:
+            index, count = (int(part) for part in value.split('/'))
+        except ValueError:
+            raise CommandError('Шард задается в виде i/N, например 0/4')
+        if count < 1 or not 0 <= index < count:
+            raise CommandError('Номер шарда должен быть от 0 до N-1')
+        return index, count
+
+    def _get_sleep(self, max_sleep, shard):
+        next_send_at = get_next_send_at(shard)
+        if next_send_at is None:
+            return max_sleep
+        return min(max(0.0, (next_send_at - timezone.now()).total_seconds()), max_sleep)
+
+    def _request_stop(self, signum, frame):
+        self._stop.set()
@@ -0,0 +1,75 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:27
+
+import datetime
+
+from django.db import migrations, models
+from django.db.models import Max
+from django.utils import timezone
+import django.db.models.deletion
+import pytz
+
+PERIOD_DAYS = {'daily': 1, 'weekly': 7, 'monthly': 30}
+
+
+def fill_subscription_states(apps, schema_editor):
+    Mailing = apps.get_model('main', 'Mailing')
+    MailingLog = apps.get_model('main', 'MailingLog')
+    SubscriptionState = apps.get_model('main', 'SubscriptionState')
+    mailing_timezone = pytz.timezone('Europe/Moscow')
+    now = timezone.now()
+
+    last_tries = {
+        (row['log_mailing'], row['log_client']): row['last_try']
+        for row in MailingLog.objects.values('log_mailing', 'log_client').annotate(last_try=Max('created_time'))
+    }
+    mailings = {mailing.pk: mailing for mailing in Mailing.objects.all()}
+
+    states = []
+    for subscription in Mailing.mailing_clients.through.objects.all().iterator():
+        mailing = mailings[subscription.mailing_id]
+        last_try = last_tries.get((subscription.mailing_id, subscription.client_id))
+        if last_try is None:
+            next_send_at = now
+        else:
+            send_date = last_try.astimezone(mailing_timezone).date() + datetime.timedelta(
+                days=PERIOD_DAYS[mailing.send_frequency]
+            )
+            next_send_at = mailing_timezone.localize(datetime.datetime.combine(send_date, mailing.send_time))
+        states.append(SubscriptionState(
+            mailing_id=subscription.mailing_id,
+            client_id=subscription.client_id,
+            last_sent_at=last_try,
+            next_send_at=next_send_at,
+        ))
+    SubscriptionState.objects.bulk_create(states, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubscriptionState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_sent_at', models.DateTimeField(blank=True, null=True, verbose_name='дата и время последней попытки')),
+                ('next_send_at', models.DateTimeField(db_index=True, verbose_name='дата и время следующей отправки')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='количество попыток')),
+                ('last_status', models.CharField(blank=True, choices=[('ok', 'Успешно'), ('failed', 'Ошибка')], max_length=20, null=True, verbose_name='статус последней попытки')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.client', verbose_name='подписчик')),
+                ('mailing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.mailing', verbose_name='рассылка')),
+            ],
+            options={
+                'verbose_name': 'состояние подписки',
+                'verbose_name_plural': 'состояния подписок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='subscriptionstate',
+            constraint=models.UniqueConstraint(fields=('mailing', 'client'), name='unique_subscription_state'),
+        ),
+        migrations.RunPython(fill_subscription_states, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_subscriptionstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscriptionstate',
+            name='lease_owner',
+            field=models.CharField(blank=True, max_length=100, null=True, verbose_name='обработчик'),
+        ),
+        migrations.AddField(
+            model_name='subscriptionstate',
+            name='leased_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='захвачено до'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_subscriptionstate_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscriptionstate',
+            name='retries',
+            field=models.PositiveIntegerField(default=0, verbose_name='количество повторов подряд'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_subscriptionstate_retries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailingLogRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='дата')),
+                ('ok_count', models.PositiveIntegerField(default=0, verbose_name='успешных попыток')),
+                ('failed_count', models.PositiveIntegerField(default=0, verbose_name='неудачных попыток')),
+                ('log_client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.client', verbose_name='подписчик')),
+                ('log_mailing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.mailing', verbose_name='рассылка')),
+            ],
+            options={
+                'verbose_name': 'сводка логов за день',
+                'verbose_name_plural': 'сводки логов по дням',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='mailinglogrollup',
+            constraint=models.UniqueConstraint(fields=('log_mailing', 'log_client', 'date'), name='unique_mailing_log_rollup'),
+        ),
+    ]
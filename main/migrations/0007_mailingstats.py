@@ -0,0 +1,68 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:32
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+import pytz
+
+
+def fill_mailing_stats(apps, schema_editor):
+    Mailing = apps.get_model('main', 'Mailing')
+    MailingLog = apps.get_model('main', 'MailingLog')
+    MailingLogRollup = apps.get_model('main', 'MailingLogRollup')
+    MailingStats = apps.get_model('main', 'MailingStats')
+
+    owners = dict(Mailing.objects.values_list('pk', 'mailing_owner_id'))
+    counts = {}
+    detail = MailingLog.objects.annotate(
+        date=TruncDate('created_time', tzinfo=pytz.timezone('Europe/Moscow')),
+    ).values('log_mailing_id', 'date').annotate(
+        ok_count=Count('id', filter=Q(log_status='ok')),
+        failed_count=Count('id', filter=~Q(log_status='ok')),
+    ).order_by()
+    rollups = MailingLogRollup.objects.values('log_mailing_id', 'date').annotate(
+        ok_count=Sum('ok_count'),
+        failed_count=Sum('failed_count'),
+    ).order_by()
+    for row in [*detail, *rollups]:
+        sent, failed = counts.get((row['log_mailing_id'], row['date']), (0, 0))
+        counts[(row['log_mailing_id'], row['date'])] = (sent + row['ok_count'], failed + row['failed_count'])
+
+    MailingStats.objects.bulk_create([
+        MailingStats(mailing_id=mailing_id, owner_id=owners.get(mailing_id), date=date,
+                     sent_count=sent, failed_count=failed)
+        for (mailing_id, date), (sent, failed) in counts.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0006_mailinglogrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailingStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='дата')),
+                ('sent_count', models.PositiveIntegerField(default=0, verbose_name='отправлено')),
+                ('failed_count', models.PositiveIntegerField(default=0, verbose_name='ошибок')),
+                ('mailing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.mailing', verbose_name='рассылка')),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='владелец')),
+            ],
+            options={
+                'verbose_name': 'статистика рассылки',
+                'verbose_name_plural': 'статистика рассылок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='mailingstats',
+            constraint=models.UniqueConstraint(fields=('mailing', 'date'), name='unique_mailing_stats'),
+        ),
+        migrations.RunPython(fill_mailing_stats, migrations.RunPython.noop),
+    ]
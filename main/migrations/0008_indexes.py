@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:46
+
+from django.db import migrations, models
+
+from main.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('main', '0007_mailingstats'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='client',
+            index=models.Index(fields=['client_owner', 'email'], name='main_client_owner_email_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='mailing',
+            index=models.Index(condition=models.Q(('mailing_status', 'started')), fields=['mailing_status'], name='main_mailing_started_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='mailinglog',
+            index=models.Index(fields=['log_mailing', 'log_client', 'created_time'], name='main_log_mailing_client_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='mailinglog',
+            index=models.Index(fields=['log_mailing', 'created_time', 'id'], name='main_log_mailing_time_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='mailinglog',
+            index=models.Index(fields=['created_time'], name='main_log_created_idx'),
+        ),
+    ]
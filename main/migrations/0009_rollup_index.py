@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:15
+
+from django.db import migrations, models
+
+from main.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('main', '0008_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='mailinglogrollup',
+            index=models.Index(fields=['log_mailing', 'date', 'id'], name='main_rollup_mailing_date_idx'),
+        ),
+    ]
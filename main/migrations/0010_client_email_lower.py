@@ -0,0 +1,73 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:17
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+from django.db.models.functions import Lower
+
+
+def merge_client(apps, keep_id, duplicate_id):
+    """Переносит подписки, состояния, логи и сводки клиента duplicate_id на keep_id"""
+    Mailing = apps.get_model('main', 'Mailing')
+    MailingLog = apps.get_model('main', 'MailingLog')
+    MailingLogRollup = apps.get_model('main', 'MailingLogRollup')
+    SubscriptionState = apps.get_model('main', 'SubscriptionState')
+    Subscription = Mailing.mailing_clients.through
+
+    mailing_ids = Subscription.objects.filter(client_id=duplicate_id).values_list('mailing_id', flat=True)
+    Subscription.objects.bulk_create(
+        [Subscription(mailing_id=mailing_id, client_id=keep_id) for mailing_id in mailing_ids],
+        ignore_conflicts=True,
+    )
+    kept_states = SubscriptionState.objects.filter(client_id=keep_id).values_list('mailing_id', flat=True)
+    SubscriptionState.objects.filter(client_id=duplicate_id).exclude(mailing_id__in=kept_states).update(
+        client_id=keep_id,
+    )
+    MailingLog.objects.filter(log_client_id=duplicate_id).update(log_client_id=keep_id)
+    kept_rollups = {
+        (rollup.log_mailing_id, rollup.date): rollup
+        for rollup in MailingLogRollup.objects.filter(log_client_id=keep_id)
+    }
+    for rollup in MailingLogRollup.objects.filter(log_client_id=duplicate_id):
+        kept = kept_rollups.get((rollup.log_mailing_id, rollup.date))
+        if kept is None:
+            rollup.log_client_id = keep_id
+            rollup.save(update_fields=['log_client'])
+        else:
+            kept.ok_count += rollup.ok_count
+            kept.failed_count += rollup.failed_count
+            kept.save(update_fields=['ok_count', 'failed_count'])
+
+
+def lowercase_client_emails(apps, schema_editor):
+    """
+    Клиенты одного владельца, почта которых отличается только регистром,
+    сливаются в самого старого, затем вся почта приводится к нижнему регистру.
+    """
+    Client = apps.get_model('main', 'Client')
+    clients = Client.objects.filter(client_owner__isnull=False).annotate(email_lower=Lower('email'))
+    groups = clients.values('client_owner_id', 'email_lower').annotate(
+        count=Count('id'), keep_id=Min('id'),
+    ).filter(count__gt=1).order_by()
+    for group in groups:
+        duplicate_ids = list(clients.filter(
+            client_owner_id=group['client_owner_id'], email_lower=group['email_lower'],
+        ).exclude(pk=group['keep_id']).values_list('pk', flat=True))
+        for duplicate_id in duplicate_ids:
+            merge_client(apps, group['keep_id'], duplicate_id)
+        Client.objects.filter(pk__in=duplicate_ids).delete()
+    Client.objects.exclude(email=Lower('email')).update(email=Lower('email'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_rollup_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(lowercase_client_emails, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='client',
+            constraint=models.UniqueConstraint(Lower('email'), models.F('client_owner'), name='unique_client_owner_email'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:02
+
+from django.db import migrations, models
+
+from main.operations import AddIndexConcurrently, RemoveIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('main', '0010_client_email_lower'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='client',
+            index=models.Index(
+                fields=['client_owner', 'email'], name='main_client_email_prefix_idx',
+                opclasses=['int8_ops', 'varchar_pattern_ops'],
+            ),
+        ),
+        RemoveIndexConcurrently(
+            model_name='client',
+            name='main_client_owner_email_idx',
+        ),
+    ]
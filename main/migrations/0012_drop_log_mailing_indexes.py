@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from main.operations import RemoveIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('main', '0011_client_email_prefix_index'),
+    ]
+
+    operations = [
+        RemoveIndexConcurrently(
+            model_name='mailinglog',
+            name='main_log_mailing_client_idx',
+        ),
+        migrations.AlterField(
+            model_name='mailinglog',
+            name='log_mailing',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='main.mailing', verbose_name='рассылка'),
+        ),
+    ]
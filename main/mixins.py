@@ -0,0 +1,28 @@
+from main.pagination import get_keyset_page
+
+
+class CachedObjectMixin:
+    """
+    Загружает объект один раз за запрос, даже если get_object вызывается
+    и из test_func, и из обработчика запроса.
+    """
+
+    def get_object(self, queryset=None):
+        if queryset is not None:
+            return super().get_object(queryset)
+        if not hasattr(self, '_cached_object'):
+            self._cached_object = super().get_object()
+        return self._cached_object
+
+
+class KeysetListMixin:
+    """
+    Постраничный вывод ListView по ключу: страница задается параметром ?cursor=,
+    а в контекст попадает только она и объект page с курсором следующей.
+    """
+    keyset_ordering = ('-id',)
+    page_size = 30
+
+    def get_context_data(self, **kwargs):
+        page = get_keyset_page(self.object_list, self.keyset_ordering, self.request.GET.get('cursor'), self.page_size)
+        return super().get_context_data(object_list=page.object_list, page=page, **kwargs)
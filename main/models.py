@@ -1,7 +1,13 @@
+import datetime
+
+import pytz
 from django.db import models
+from django.db.models.functions import Lower
 
 from config import settings
 
+MAILING_TIMEZONE = pytz.timezone('Europe/Moscow')
+
 NULLABLE = {
     'null': True,
     'blank': True
@@ -19,9 +25,23 @@ class Client(models.Model):
     def __str__(self):
         return f'{self.email} ({self.first_name} {self.last_name})'
 
+    def save(self, *args, **kwargs):
+        self.email = self.email.lower()
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = 'клиент'
         verbose_name_plural = 'клиенты'
+        indexes = [
+            # pattern ops нужны для поиска по началу почты, равенство индекс тоже поддерживает
+            models.Index(
+                fields=('client_owner', 'email'), opclasses=['int8_ops', 'varchar_pattern_ops'],
+                name='main_client_email_prefix_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(Lower('email'), 'client_owner', name='unique_client_owner_email'),
+        ]
 
 
 class Mailing(models.Model):
@@ -35,6 +55,12 @@ class Mailing(models.Model):
         (PERIOD_MONTHLY, 'Раз в месяц'),
     )
 
+    PERIOD_DAYS = {
+        PERIOD_DAILY: 1,
+        PERIOD_WEEKLY: 7,
+        PERIOD_MONTHLY: 30,
+    }
+
     STATUS_CREATED = 'created'
     STATUS_STARTED = 'started'
     STATUS_DONE = 'done'
@@ -55,12 +81,23 @@ class Mailing(models.Model):
     def __str__(self):
         return f"Рассылка {self.subject} в {self.send_time} ({self.send_frequency})"
 
+    def get_next_send_at(self, sent_at):
+        """Время следующей отправки: через период рассылки после sent_at, в send_time по Москве"""
+        send_date = sent_at.astimezone(MAILING_TIMEZONE).date() + datetime.timedelta(
+            days=self.PERIOD_DAYS[self.send_frequency]
+        )
+        return MAILING_TIMEZONE.localize(datetime.datetime.combine(send_date, self.send_time))
+
     class Meta:
         verbose_name = 'рассылка'
         verbose_name_plural = 'рассылки'
         permissions = [
             ('set_mailing_status', 'Can change the status of mailing'),
         ]
+        indexes = [
+            models.Index(fields=('mailing_status',), condition=models.Q(mailing_status='started'),
+                         name='main_mailing_started_idx'),
+        ]
 
 
 class MailingLog(models.Model):
@@ -74,7 +111,8 @@ class MailingLog(models.Model):
     created_time = models.DateTimeField(auto_now_add=True, verbose_name='дата и время последней попытки')
     log_status = models.CharField(max_length=20, choices=STATUSES, verbose_name='статус попытки')
     log_client = models.ForeignKey(Client, on_delete=models.CASCADE, verbose_name='подписчик')
-    log_mailing = models.ForeignKey(Mailing, on_delete=models.CASCADE, verbose_name='рассылка')
+    # отдельный индекс не нужен: log_mailing открывает main_log_mailing_time_idx
+    log_mailing = models.ForeignKey(Mailing, on_delete=models.CASCADE, db_index=False, verbose_name='рассылка')
     response = models.TextField(**NULLABLE, verbose_name='ответ сервера')
 
     def __str__(self):
@@ -82,4 +120,70 @@ class MailingLog(models.Model):
 
     class Meta:
         verbose_name = 'лог'
-        verbose_name_plural = 'логи'
\ No newline at end of file
+        verbose_name_plural = 'логи'
+        indexes = [
+            models.Index(fields=('log_mailing', 'created_time', 'id'), name='main_log_mailing_time_idx'),
+            models.Index(fields=('created_time',), name='main_log_created_idx'),
+        ]
+
+
+class MailingLogRollup(models.Model):
+    date = models.DateField(verbose_name='дата')
+    log_client = models.ForeignKey(Client, on_delete=models.CASCADE, verbose_name='подписчик')
+    log_mailing = models.ForeignKey(Mailing, on_delete=models.CASCADE, verbose_name='рассылка')
+    ok_count = models.PositiveIntegerField(default=0, verbose_name='успешных попыток')
+    failed_count = models.PositiveIntegerField(default=0, verbose_name='неудачных попыток')
+
+    def __str__(self):
+        return f"{self.log_client} - {self.log_mailing} за {self.date}: {self.ok_count}/{self.failed_count}"
+
+    class Meta:
+        verbose_name = 'сводка логов за день'
+        verbose_name_plural = 'сводки логов по дням'
+        constraints = [
+            models.UniqueConstraint(fields=('log_mailing', 'log_client', 'date'), name='unique_mailing_log_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=('log_mailing', 'date', 'id'), name='main_rollup_mailing_date_idx'),
+        ]
+
+
+class MailingStats(models.Model):
+    date = models.DateField(verbose_name='дата')
+    mailing = models.ForeignKey(Mailing, on_delete=models.CASCADE, verbose_name='рассылка')
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, verbose_name='владелец', **NULLABLE)
+    sent_count = models.PositiveIntegerField(default=0, verbose_name='отправлено')
+    failed_count = models.PositiveIntegerField(default=0, verbose_name='ошибок')
+
+    def __str__(self):
+        return f"{self.mailing} за {self.date}: {self.sent_count}/{self.failed_count}"
+
+    class Meta:
+        verbose_name = 'статистика рассылки'
+        verbose_name_plural = 'статистика рассылок'
+        constraints = [
+            models.UniqueConstraint(fields=('mailing', 'date'), name='unique_mailing_stats'),
+        ]
+
+
+class SubscriptionState(models.Model):
+    mailing = models.ForeignKey(Mailing, on_delete=models.CASCADE, verbose_name='рассылка')
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, verbose_name='подписчик')
+    last_sent_at = models.DateTimeField(**NULLABLE, verbose_name='дата и время последней попытки')
+    next_send_at = models.DateTimeField(db_index=True, verbose_name='дата и время следующей отправки')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='количество попыток')
+    retries = models.PositiveIntegerField(default=0, verbose_name='количество повторов подряд')
+    last_status = models.CharField(max_length=20, choices=MailingLog.STATUSES, **NULLABLE,
+                                   verbose_name='статус последней попытки')
+    leased_until = models.DateTimeField(**NULLABLE, verbose_name='захвачено до')
+    lease_owner = models.CharField(max_length=100, **NULLABLE, verbose_name='обработчик')
+
+    def __str__(self):
+        return f"{self.client} - {self.mailing} (следующая отправка {self.next_send_at})"
+
+    class Meta:
+        verbose_name = 'состояние подписки'
+        verbose_name_plural = 'состояния подписок'
+        constraints = [
+            models.UniqueConstraint(fields=('mailing', 'client'), name='unique_subscription_state'),
+        ]
@@ -0,0 +1,111 @@
+import base64
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class KeysetPage:
+    """Страница выборки при постраничном выводе по ключу (keyset pagination)"""
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder округляет время до миллисекунд, а курсору нужна полная точность"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, cls=CursorEncoder).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def get_keyset_page(queryset, ordering, cursor=None, page_size=50):
+    """
+    Возвращает страницу queryset, упорядоченного по ordering, начиная после cursor.
+
+    ordering - поля сортировки в одном направлении, последним должно идти
+    уникальное поле, например ('-created_time', '-id'). В отличие от OFFSET
+    стоимость запроса не растет с номером страницы.
+    """
+    names = [field.lstrip('-') for field in ordering]
+    descending = ordering[0].startswith('-')
+    lookup = 'lt' if descending else 'gt'
+
+    model_fields = [queryset.model._meta.get_field(name) for name in names]
+
+    values = decode_cursor(cursor) if cursor else None
+    if values is not None and len(values) == len(names):
+        try:
+            values = [field.to_python(value) for field, value in zip(model_fields, values)]
+        except (ValidationError, TypeError, ValueError):
+            values = None
+        # курсор из запроса не проверен: неверное значение означает первую страницу
+        if values is not None and None not in values:
+            condition = Q()
+            for index, name in enumerate(names):
+                step = Q(**{f'{name}__{lookup}': values[index]})
+                for previous in range(index):
+                    step &= Q(**{names[previous]: values[previous]})
+                condition |= step
+            queryset = queryset.filter(condition)
+
+    object_list = list(queryset.order_by(*ordering)[:page_size + 1])
+    next_cursor = None
+    if len(object_list) > page_size:
+        object_list = object_list[:page_size]
+        last = object_list[-1]
+        next_cursor = encode_cursor([getattr(last, field.attname) for field in model_fields])
+    return KeysetPage(object_list, next_cursor)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator, который для нефильтрованной выборки из большой таблицы PostgreSQL
+    берет оценку числа строк из pg_class вместо COUNT(*) по всей таблице.
+    Для маленьких таблиц, фильтров и других СУБД считает точно.
+    """
+    exact_count_threshold = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if getattr(queryset, 'query', None) is not None and not queryset.query.where:
+            connection = connections[queryset.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s',
+                                   [queryset.model._meta.db_table])
+                    row = cursor.fetchone()
+                if row and row[0] >= self.exact_count_threshold:
+                    return int(row[0])
+        return super().count
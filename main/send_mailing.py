@@ -3,73 +3,191 @@ import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 django.setup()
-import smtplib
-from email.mime.text import MIMEText
 import datetime
+import email.policy
+import socket
+from collections import namedtuple
+from email.mime.text import MIMEText
+from concurrent.futures import ThreadPoolExecutor, wait
 from smtplib import SMTPException
-from main.models import Mailing, MailingLog
-import pytz
-from decouple import config
-
-
-def send_mails():
-    now = datetime.datetime.now()
-    for mailing in Mailing.objects.filter(mailing_status=Mailing.STATUS_STARTED):
-        for mailing_client in mailing.mailing_clients.all():
-            mailing_log = MailingLog.objects.filter(log_client=mailing_client, log_mailing=mailing)
-            if mailing_log.exists():
-                last_try = mailing_log.order_by('-created_time').first()
-                desired_timezone = pytz.timezone('Europe/Moscow')
-                last_try_date = last_try.created_time.astimezone(desired_timezone)
-                if mailing.PERIOD_DAILY:
-                    if (now.date() - last_try_date.date()).days >= 1:
-                        send_email(mailing, mailing_client)
-                elif mailing.PERIOD_WEEKLY:
-                    if (now.date() - last_try_date.date()).days >= 7:
-                        send_email(mailing, mailing_client)
-                elif mailing.PERIOD_MONTHLY:
-                    if (now.date() - last_try_date.date()).days >= 30:
-                        send_email(mailing, mailing_client)
-            else:
-                send_email(mailing, mailing_client)
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, Q
+from django.db.models.functions import Coalesce, Greatest, Mod
+from django.utils import timezone
+from main.log_writer import MailingLogWriter
+from main.models import Mailing, MailingLog, SubscriptionState
+from main.smtp import get_connection_pool, get_rate_limiter, is_temporary_error
 
 
+DeliveryResult = namedtuple('DeliveryResult', ('status', 'response', 'temporary'))
 
-def send_email(mailing, mailing_client):
-    """Функция по отправке сообщений пользователю"""
-    file_content = mailing.body
+WORKER_ID = f'{socket.gethostname()}:{os.getpid()}'
 
-    msg = MIMEText(file_content)
-    msg['Subject'] = mailing.subject
-    msg['From'] = config('EMAIL_HOST_USER')
-    msg['To'] = mailing_client.email
 
-    smtp_server = config('EMAIL_HOST')
-    smtp_port = config('EMAIL_PORT')
-    smtp_username = config('EMAIL_HOST_USER')
-    smtp_password = config('EMAIL_HOST_PASSWORD')
+def filter_shard(queryset, shard):
+    """Оставляет только подписки рассылок из шарда shard=(номер, количество шардов)"""
+    if shard is None:
+        return queryset
+    index, count = shard
+    return queryset.annotate(shard=Mod('mailing_id', count)).filter(shard=index)
 
-    s = smtplib.SMTP_SSL(smtp_server, smtp_port)
-    s.login(smtp_username, smtp_password)
-    try:
-        s.sendmail('polinaskypro@yandex.ru', [mailing_client.email], msg.as_string())
-        s.quit()
-        MailingLog.objects.create(
-            log_status=MailingLog.STATUS_OK,
-            log_client=mailing_client,
-            log_mailing=mailing,
-            response='отправлено'
+
+def claim_due_subscriptions(now=None, limit=None, shard=None, mailing_ids=None):
+    """
+    Планировщик: выбирает по индексу next_send_at подписки запущенных рассылок,
+    которым пора отправить письмо, и захватывает их на MAILING_LEASE_TTL секунд.
+    mailing_ids ограничивает выбор указанными рассылками.
+
+    Строки блокируются через SELECT ... FOR UPDATE SKIP LOCKED, поэтому
+    параллельные обработчики получают непересекающиеся наборы подписок.
+    """
+    if now is None:
+        now = timezone.now()
+    if limit is None:
+        limit = settings.MAILING_CLAIM_BATCH_SIZE
+
+    with transaction.atomic():
+        due = SubscriptionState.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+            Q(leased_until__isnull=True) | Q(leased_until__lt=now),
+            mailing__mailing_status=Mailing.STATUS_STARTED,
+            next_send_at__lte=now,
         )
-    except SMTPException as e:
-        MailingLog.objects.create(
-            log_status=MailingLog.STATUS_FAILED,
-            log_client=mailing_client,
-            log_mailing=mailing,
-            response=e
+        if mailing_ids is not None:
+            due = due.filter(mailing_id__in=mailing_ids)
+        ids = list(filter_shard(due, shard).order_by('next_send_at', 'id').values_list('id', flat=True)[:limit])
+        if not ids:
+            return []
+        SubscriptionState.objects.filter(id__in=ids).update(
+            leased_until=now + datetime.timedelta(seconds=settings.MAILING_LEASE_TTL),
+            lease_owner=WORKER_ID,
         )
+    return list(
+        SubscriptionState.objects.filter(id__in=ids).select_related('mailing', 'client').order_by('next_send_at', 'id')
+    )
+
+
+def renew_leases(subscriptions):
+    """
+    Продлевает аренду подписок перед отправкой очередной части пачки и возвращает
+    только те, что все еще принадлежат этому обработчику: после истечения аренды
+    подписку мог захватить другой обработчик.
+    """
+    leased_until = timezone.now() + datetime.timedelta(seconds=settings.MAILING_LEASE_TTL)
+    with transaction.atomic():
+        owned = set(SubscriptionState.objects.select_for_update().filter(
+            id__in=[subscription.id for subscription in subscriptions], lease_owner=WORKER_ID,
+        ).values_list('id', flat=True))
+        SubscriptionState.objects.filter(id__in=owned).update(leased_until=leased_until)
+    return [subscription for subscription in subscriptions if subscription.id in owned]
+
+
+def get_next_send_at(shard=None):
+    """
+    Ближайшее время отправки среди запущенных рассылок, None если отправлять некому.
+    Захваченная другим обработчиком подписка освободится не раньше конца аренды.
+    """
+    states = SubscriptionState.objects.filter(mailing__mailing_status=Mailing.STATUS_STARTED)
+    available_at = Greatest('next_send_at', Coalesce('leased_until', 'next_send_at'))
+    return filter_shard(states, shard).aggregate(next_send_at=Min(available_at))['next_send_at']
+
+
+def deliver_chunk(executor, dispatcher, log_writer, subscriptions):
+    """
+    Отправляет письма подписок в пуле потоков и записывает результаты в порядке подписок.
+    Если запись результата упала, еще не начатые отправки отменяются, а результаты
+    уже отправленных писем остаются в буфере, чтобы письма не ушли повторно.
+    """
+    futures = [executor.submit(dispatcher.deliver, subscription.mailing, subscription.client)
+               for subscription in subscriptions]
+    pending = zip(subscriptions, futures)
+    try:
+        for subscription, future in pending:
+            log_writer.add(subscription, *future.result())
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        for subscription, future in pending:
+            if not future.cancelled() and future.exception() is None:
+                log_writer.record(subscription, *future.result())
+        raise
 
 
+def send_mails(workers=None, shard=None, dispatcher=None, mailing_ids=None):
+    """
+    Отправка писем всем подписчикам, у которых подошел срок.
+
+    Подписки захватываются пачками, SMTP-запросы выполняются в пуле из workers
+    потоков частями по MAILING_DISPATCH_CHUNK_SIZE писем, а результаты копятся
+    в основном потоке в порядке, который вернул планировщик, и пишутся пачками.
+    Перед каждой частью аренда ее подписок продлевается, поэтому длинная пачка
+    не отдается другому обработчику посреди отправки.
+    """
+    if workers is None:
+        workers = settings.MAILING_WORKERS
+    if dispatcher is None:
+        dispatcher = MailingDispatcher()
+    chunk_size = settings.MAILING_DISPATCH_CHUNK_SIZE
+
+    with MailingLogWriter() as log_writer, ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        while True:
+            subscriptions = claim_due_subscriptions(shard=shard, mailing_ids=mailing_ids)
+            if not subscriptions:
+                break
+            for start in range(0, len(subscriptions), chunk_size):
+                chunk = renew_leases(subscriptions[start:start + chunk_size])
+                deliver_chunk(executor, dispatcher, log_writer, chunk)
+            log_writer.flush()
+
+
+class MailingDispatcher:
+    """
+    Отправка писем рассылок.
+
+    Настройки SMTP читаются один раз при создании, а письмо каждой рассылки
+    собирается и кодируется один раз: для подписчика к готовым байтам
+    добавляется только заголовок To.
+    """
+
+    def __init__(self):
+        self.from_addr = settings.EMAIL_HOST_USER
+        self.pool = get_connection_pool()
+        self.rate_limiter = get_rate_limiter(settings.EMAIL_HOST)
+        self._messages = {}
+
+    def get_message(self, mailing):
+        message = self._messages.get(mailing.pk)
+        if message is None:
+            msg = MIMEText(mailing.body, _charset='utf-8', policy=email.policy.SMTP)
+            msg['Subject'] = mailing.subject
+            msg['From'] = self.from_addr
+            message = self._messages[mailing.pk] = msg.as_bytes()
+        return message
+
+    def deliver(self, mailing, mailing_client):
+        """Отправляет письмо подписчику и возвращает результат попытки"""
+        message = b'To: ' + mailing_client.email.encode() + b'\r\n' + self.get_message(mailing)
+
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+        try:
+            self.pool.send(self.from_addr, [mailing_client.email], message)
+        except (SMTPException, OSError) as e:
+            return DeliveryResult(MailingLog.STATUS_FAILED, str(e), is_temporary_error(e))
+        return DeliveryResult(MailingLog.STATUS_OK, 'отправлено', False)
+
+
+def send_email(mailing, mailing_client):
+    """Функция по отправке сообщений пользователю"""
+    subscription, _ = SubscriptionState.objects.get_or_create(
+        mailing=mailing, client=mailing_client, defaults={'next_send_at': timezone.now()}
+    )
+    result = MailingDispatcher().deliver(mailing, mailing_client)
+    with MailingLogWriter() as log_writer:
+        log_writer.add(subscription, *result)
 
 
 if __name__ == '__main__':
-    send_mails()
\ No newline at end of file
+    send_mails()
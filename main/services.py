@@ -0,0 +1,205 @@
+import datetime
+import random
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Min, Q, Value, When
+from django.utils import timezone
+
+from main.cache import cached
+from main.models import MAILING_TIMEZONE, Mailing, MailingLog, MailingLogRollup, MailingStats, SubscriptionState
+from main.pagination import KeysetPage, encode_cursor, get_keyset_page
+
+ROLLUP_CURSOR_PREFIX = 'r.'
+LOG_EXPORT_COLUMNS = ('created_time', 'log_status', 'log_client__email', 'response', 'attempts')
+
+
+@cached('mailing')
+def get_mailing_counts():
+    """Число всех и запущенных рассылок"""
+    return {
+        'mailing_count': Mailing.objects.count(),
+        'active_count': Mailing.objects.filter(mailing_status=Mailing.STATUS_STARTED).count(),
+    }
+
+
+def create_subscription_states(pairs, now=None):
+    """Создание состояний доставки для новых пар (id рассылки, id подписчика)"""
+    if now is None:
+        now = timezone.now()
+    SubscriptionState.objects.bulk_create(
+        [SubscriptionState(mailing_id=mailing_id, client_id=client_id, next_send_at=now)
+         for mailing_id, client_id in pairs],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+
+
+def reschedule_subscription_states(mailing):
+    """Пересчет времени следующей отправки после изменения расписания рассылки"""
+    states = SubscriptionState.objects.filter(mailing=mailing, last_sent_at__isnull=False).only(
+        'id', 'last_sent_at', 'next_send_at'
+    )
+    batch = []
+    for state in states.iterator(chunk_size=1000):
+        state.next_send_at = mailing.get_next_send_at(state.last_sent_at)
+        batch.append(state)
+        if len(batch) >= 1000:
+            SubscriptionState.objects.bulk_update(batch, ['next_send_at'])
+            batch = []
+    if batch:
+        SubscriptionState.objects.bulk_update(batch, ['next_send_at'])
+
+
+def get_retry_delay(retries):
+    """Экспоненциальная задержка перед повтором номер retries со случайным разбросом"""
+    delay = min(settings.MAILING_RETRY_MAX_DELAY, settings.MAILING_RETRY_BASE_DELAY * 2 ** (retries - 1))
+    return datetime.timedelta(seconds=delay / 2 + random.uniform(0, delay / 2))
+
+
+def add_mailing_stats(counts):
+    """
+    Увеличивает счетчики MailingStats двумя запросами независимо от числа рассылок.
+    counts - словарь (id рассылки, id владельца, дата) -> (отправлено, ошибок).
+    """
+    if not counts:
+        return
+    MailingStats.objects.bulk_create(
+        [MailingStats(mailing_id=mailing_id, owner_id=owner_id, date=date) for mailing_id, owner_id, date in counts],
+        ignore_conflicts=True,
+    )
+    keys = Q()
+    sent_cases, failed_cases = [], []
+    for (mailing_id, owner_id, date), (sent, failed) in counts.items():
+        keys |= Q(mailing_id=mailing_id, date=date)
+        sent_cases.append(When(mailing_id=mailing_id, date=date, then=Value(sent)))
+        failed_cases.append(When(mailing_id=mailing_id, date=date, then=Value(failed)))
+    MailingStats.objects.filter(keys).update(
+        sent_count=F('sent_count') + Case(*sent_cases, default=Value(0), output_field=IntegerField()),
+        failed_count=F('failed_count') + Case(*failed_cases, default=Value(0), output_field=IntegerField()),
+    )
+
+
+def get_day_bounds(day):
+    """Начало дня day и начало следующего дня по московскому времени"""
+    start = MAILING_TIMEZONE.localize(datetime.datetime.combine(day, datetime.time.min))
+    end = MAILING_TIMEZONE.localize(datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min))
+    return start, end
+
+
+def compact_log_day(day):
+    """Сворачивает логи за день day в счетчики MailingLogRollup и удаляет детальные записи"""
+    start, end = get_day_bounds(day)
+    with transaction.atomic():
+        logs = MailingLog.objects.filter(created_time__gte=start, created_time__lt=end)
+        counts = logs.values('log_mailing_id', 'log_client_id').annotate(
+            ok_count=Count('id', filter=Q(log_status=MailingLog.STATUS_OK)),
+            failed_count=Count('id', filter=~Q(log_status=MailingLog.STATUS_OK)),
+        )
+        rollups = {
+            (rollup.log_mailing_id, rollup.log_client_id): rollup
+            for rollup in MailingLogRollup.objects.filter(date=day)
+        }
+        created, updated = [], []
+        for row in counts:
+            rollup = rollups.get((row['log_mailing_id'], row['log_client_id']))
+            if rollup is None:
+                created.append(MailingLogRollup(
+                    date=day,
+                    log_mailing_id=row['log_mailing_id'],
+                    log_client_id=row['log_client_id'],
+                    ok_count=row['ok_count'],
+                    failed_count=row['failed_count'],
+                ))
+            else:
+                rollup.ok_count += row['ok_count']
+                rollup.failed_count += row['failed_count']
+                updated.append(rollup)
+        MailingLogRollup.objects.bulk_create(created, batch_size=1000)
+        MailingLogRollup.objects.bulk_update(updated, ['ok_count', 'failed_count'], batch_size=1000)
+        deleted, _ = logs.delete()
+    return deleted
+
+
+def compact_logs(retention_days=None):
+    """
+    Сворачивает по дням все логи старше retention_days дней.
+    Каждый день обрабатывается в отдельной транзакции.
+    """
+    if retention_days is None:
+        retention_days = settings.MAILING_LOG_RETENTION_DAYS
+    cutoff_day = timezone.now().astimezone(MAILING_TIMEZONE).date() - datetime.timedelta(days=retention_days)
+    cutoff, _ = get_day_bounds(cutoff_day)
+
+    oldest = MailingLog.objects.filter(created_time__lt=cutoff).aggregate(oldest=Min('created_time'))['oldest']
+    if oldest is None:
+        return 0
+
+    deleted = 0
+    day = oldest.astimezone(MAILING_TIMEZONE).date()
+    while day < cutoff_day:
+        deleted += compact_log_day(day)
+        day += datetime.timedelta(days=1)
+    return deleted
+
+
+def get_mailing_history(mailing):
+    """
+    Число успешных и неудачных попыток рассылки по дням, от новых к старым.
+    Читается из предагрегированной таблицы MailingStats, а не из логов.
+    """
+    stats = MailingStats.objects.filter(mailing=mailing).order_by('-date').values_list(
+        'date', 'sent_count', 'failed_count',
+    )
+    return [{'date': date, 'ok_count': sent_count, 'failed_count': failed_count}
+            for date, sent_count, failed_count in stats]
+
+
+def get_mailing_log_page(mailing, cursor=None, page_size=50):
+    """
+    Страница попыток рассылки от новых к старым. Сначала идут детальные логи,
+    за ними - дневные сводки, в которые compact_logs свернул логи старше срока
+    хранения: сводки всегда старше оставшихся детальных логов. Курсор сводок
+    отличается префиксом ROLLUP_CURSOR_PREFIX. Каждая страница читает оба
+    источника ровно одним запросом.
+    """
+    rollups = MailingLogRollup.objects.filter(log_mailing=mailing).select_related('log_client')
+    rollup_ordering = ('-date', '-id')
+    if cursor and cursor.startswith(ROLLUP_CURSOR_PREFIX):
+        page = get_keyset_page(rollups, rollup_ordering, cursor[len(ROLLUP_CURSOR_PREFIX):], page_size)
+        if page.has_next:
+            page.next_cursor = ROLLUP_CURSOR_PREFIX + page.next_cursor
+        return page
+
+    logs = MailingLog.objects.filter(log_mailing=mailing).select_related('log_client')
+    page = get_keyset_page(logs, ('-created_time', '-id'), cursor, page_size)
+    rollup_page = get_keyset_page(rollups, rollup_ordering, None, page_size)
+    if page.has_next:
+        return page
+    shown = rollup_page.object_list[:page_size - len(page)]
+    next_cursor = None
+    if len(shown) < len(rollup_page) or rollup_page.has_next:
+        next_cursor = ROLLUP_CURSOR_PREFIX + (encode_cursor([shown[-1].date, shown[-1].pk]) if shown else '')
+    return KeysetPage(page.object_list + shown, next_cursor)
+
+
+def iter_mailing_log_rows(mailing, chunk_size=2000):
+    """
+    Все попытки рассылки для выгрузки, строки в порядке LOG_EXPORT_COLUMNS.
+    За детальными логами идут дневные сводки: по строке на каждый статус
+    с числом попыток в attempts.
+    """
+    logs = MailingLog.objects.filter(log_mailing=mailing).order_by('-created_time', '-id').values_list(
+        'created_time', 'log_status', 'log_client__email', 'response',
+    ).iterator(chunk_size=chunk_size)
+    for row in logs:
+        yield *row, 1
+
+    rollups = MailingLogRollup.objects.filter(log_mailing=mailing).order_by('-date', '-id').values_list(
+        'date', 'log_client__email', 'ok_count', 'failed_count',
+    ).iterator(chunk_size=chunk_size)
+    for date, email, ok_count, failed_count in rollups:
+        if ok_count:
+            yield date, MailingLog.STATUS_OK, email, None, ok_count
+        if failed_count:
+            yield date, MailingLog.STATUS_FAILED, email, None, failed_count
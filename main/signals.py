@@ -0,0 +1,61 @@
+from django.db.models.signals import m2m_changed, pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from main.cache import bump_version
+from main.models import Client, Mailing, SubscriptionState
+from main.services import create_subscription_states, reschedule_subscription_states
+
+
+@receiver(m2m_changed, sender=Mailing.mailing_clients.through)
+def sync_subscription_states(sender, instance, action, reverse, pk_set, **kwargs):
+    """Поддерживает таблицу состояний доставки в соответствии с подписчиками рассылок"""
+    if action == 'post_add':
+        if reverse:
+            pairs = [(mailing_id, instance.pk) for mailing_id in pk_set]
+        else:
+            pairs = [(instance.pk, client_id) for client_id in pk_set]
+        create_subscription_states(pairs)
+    elif action == 'post_remove':
+        if reverse:
+            SubscriptionState.objects.filter(client=instance, mailing_id__in=pk_set).delete()
+        else:
+            SubscriptionState.objects.filter(mailing=instance, client_id__in=pk_set).delete()
+    elif action == 'post_clear':
+        if reverse:
+            SubscriptionState.objects.filter(client=instance).delete()
+        else:
+            SubscriptionState.objects.filter(mailing=instance).delete()
+
+
+@receiver(pre_save, sender=Mailing)
+def remember_mailing_schedule(sender, instance, **kwargs):
+    instance._schedule_changed = False
+    if instance.pk is not None:
+        old_schedule = Mailing.objects.filter(pk=instance.pk).values_list('send_time', 'send_frequency').first()
+        instance._schedule_changed = (
+            old_schedule is not None and old_schedule != (instance.send_time, instance.send_frequency)
+        )
+
+
+@receiver(post_save, sender=Mailing)
+def update_mailing_schedule(sender, instance, created, **kwargs):
+    if getattr(instance, '_schedule_changed', False):
+        reschedule_subscription_states(instance)
+
+
+@receiver(post_save, sender=Mailing)
+@receiver(post_delete, sender=Mailing)
+def reset_mailing_cache(sender, **kwargs):
+    bump_version('mailing')
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+def reset_client_cache(sender, **kwargs):
+    bump_version('client')
+
+
+@receiver(m2m_changed, sender=Mailing.mailing_clients.through)
+def reset_subscription_cache(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version('mailing', 'client')
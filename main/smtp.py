@@ -0,0 +1,201 @@
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from smtplib import SMTPServerDisconnected
+
+from django.conf import settings
+
+
+class PooledConnection:
+    """Авторизованное SMTP-соединение с учетом возраста и числа отправленных писем"""
+
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.created_at = time.monotonic()
+        self.sent = 0
+
+    def is_expired(self, max_messages, max_age):
+        return self.sent >= max_messages or time.monotonic() - self.created_at >= max_age
+
+    def close(self):
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self.smtp.close()
+
+
+class SMTPConnectionPool:
+    """
+    Пул постоянных SMTP-соединений.
+
+    Держит не более size открытых авторизованных соединений и переиспользует их
+    между письмами и рассылками. Соединение пересоздается после max_messages писем
+    или через max_age секунд, а также при разрыве связи сервером.
+    """
+
+    def __init__(self, host, port, username=None, password=None, use_ssl=True,
+                 size=4, max_messages=100, max_age=300, timeout=30):
+        self.host = host
+        self.port = int(port)
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.size = size
+        self.max_messages = max_messages
+        self.max_age = max_age
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        smtp = smtp_class(self.host, self.port, timeout=self.timeout)
+        if self.username:
+            smtp.login(self.username, self.password)
+        return PooledConnection(smtp)
+
+    def _acquire(self):
+        with self._lock:
+            while self._idle:
+                connection = self._idle.pop()
+                if not connection.is_expired(self.max_messages, self.max_age):
+                    return connection
+                connection.close()
+        return self._connect()
+
+    def _release(self, connection):
+        if connection.is_expired(self.max_messages, self.max_age):
+            connection.close()
+            return
+        with self._lock:
+            self._idle.append(connection)
+
+    @contextmanager
+    def connection(self):
+        """Выдает соединение из пула и возвращает его обратно после использования"""
+        self._slots.acquire()
+        connection = None
+        try:
+            connection = self._acquire()
+            yield connection
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException):
+            # сервер ответил кодом ошибки, но соединение осталось рабочим
+            raise
+        except BaseException:
+            if connection is not None:
+                connection.close()
+                connection = None
+            raise
+        finally:
+            if connection is not None:
+                self._release(connection)
+            self._slots.release()
+
+    def send(self, from_addr, to_addrs, message):
+        """Отправляет письмо, при разрыве соединения переподключается один раз"""
+        with self.connection() as connection:
+            try:
+                result = connection.smtp.sendmail(from_addr, to_addrs, message)
+            except SMTPServerDisconnected:
+                connection.smtp.close()
+                connection.smtp = self._connect().smtp
+                connection.created_at = time.monotonic()
+                connection.sent = 0
+                result = connection.smtp.sendmail(from_addr, to_addrs, message)
+            connection.sent += 1
+            return result
+
+    def close(self):
+        """Закрывает все простаивающие соединения"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты отправки: не более rate писем в секунду
+    с допустимым всплеском до capacity писем.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self):
+        """Блокирует поток, пока не появится свободный токен"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def is_temporary_error(error):
+    """
+    Классификация ошибки отправки: True для временных ошибок, которые имеет
+    смысл повторить (коды 4xx, разрыв соединения, сетевые ошибки),
+    False для постоянных (коды 5xx).
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPException, OSError))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_rate_limiters = {}
+
+
+def get_connection_pool():
+    """Общий для процесса пул соединений, настроенный из settings"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SMTPConnectionPool(
+                    host=settings.EMAIL_HOST,
+                    port=settings.EMAIL_PORT,
+                    username=settings.EMAIL_HOST_USER,
+                    password=settings.EMAIL_HOST_PASSWORD,
+                    use_ssl=settings.EMAIL_USE_SSL,
+                    size=settings.EMAIL_POOL_SIZE,
+                    max_messages=settings.EMAIL_POOL_MAX_MESSAGES,
+                    max_age=settings.EMAIL_POOL_MAX_AGE,
+                )
+    return _pool
+
+
+def close_connection_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def get_rate_limiter(host):
+    """Ограничитель частоты для SMTP-сервера, None если лимит не задан"""
+    rate = settings.EMAIL_RATE_LIMIT
+    if not rate:
+        return None
+    with _pool_lock:
+        if host not in _rate_limiters:
+            _rate_limiters[host] = TokenBucket(rate, settings.EMAIL_RATE_BURST)
+        return _rate_limiters[host]
@@ -0,0 +1,95 @@
+import socketserver
+import threading
+import time
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Минимальная реализация SMTP: принимает любые письма и только считает их"""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.reply('220 localhost SMTP sink')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command, _, argument = line.decode(errors='replace').strip().partition(' ')
+            command = command.upper()
+            if command == 'EHLO':
+                self.wfile.write(b'250-localhost\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n')
+            elif command == 'HELO':
+                self.reply('250 localhost')
+            elif command == 'AUTH':
+                self.reply('235 Authentication successful')
+            elif command == 'RCPT' and self.server.get_rejection(argument):
+                self.reply(f'{self.server.get_rejection(argument)} Recipient rejected')
+            elif command in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                for data_line in self.rfile:
+                    if data_line == b'.\r\n':
+                        break
+                if self.server.delay:
+                    time.sleep(self.server.delay)
+                self.server.register_message()
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """
+    Локальный SMTP-сервер для тестов и замеров, работающий в отдельном потоке.
+
+    delay задает искусственную задержку ответа на каждое письмо в секундах,
+    rejected - словарь адрес -> код ответа для отклоняемых получателей.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, delay=0.0, rejected=None):
+        super().__init__((host, port), SMTPSinkHandler)
+        self.delay = delay
+        self.rejected = rejected or {}
+        self.message_count = 0
+        self.connection_count = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def process_request(self, request, client_address):
+        with self._lock:
+            self.connection_count += 1
+        super().process_request(request, client_address)
+
+    def get_rejection(self, argument):
+        address = argument.partition(':')[2].strip().strip('<>')
+        return self.rejected.get(address)
+
+    def register_message(self):
+        with self._lock:
+            self.message_count += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,82 @@
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver
+from django.utils import timezone
+
+from main.bench import generate_mailing_data
+from main.models import MAILING_TIMEZONE, MailingLog
+from main.services import add_mailing_stats
+
+
+def get_url_names(urlconf):
+    """Имена всех маршрутов модуля urls"""
+    return {pattern.name for pattern in get_resolver(urlconf).url_patterns if pattern.name}
+
+
+def add_mailing_logs(mailings, clients):
+    MailingLog.objects.bulk_create([
+        MailingLog(log_mailing=mailing, log_client=client, log_status=MailingLog.STATUS_OK)
+        for mailing in mailings for client in clients
+    ], batch_size=1000)
+
+
+def grow_mailing_data(owner, clients=300, mailings=10):
+    """Добавляет владельцу рассылок, подписчиков, логов по одному на каждую подписку и статистики"""
+    _, mailing_objects, client_objects = generate_mailing_data(clients, mailings, owner_email=owner.email)
+    add_mailing_logs(mailing_objects, client_objects)
+    today = timezone.now().astimezone(MAILING_TIMEZONE).date()
+    add_mailing_stats({(mailing.pk, owner.pk, today): (clients, 0) for mailing in mailing_objects})
+    return mailing_objects, client_objects
+
+
+class ViewBudgetMixin:
+    """
+    Проверка бюджетов представлений: число запросов и время ответа.
+
+    Подкласс задает urlconf и метод get_cases(), который возвращает словарь
+    {имя маршрута: (пользователь, url, число запросов)}, и метод grow_data(),
+    который многократно увеличивает объем данных. Каждый маршрут вызывается
+    до и после роста данных и оба раза должен выполнить ровно столько запросов,
+    сколько указано в бюджете, и ответить быстрее latency_budget секунд.
+    """
+    urlconf = None
+    latency_budget = 0.5
+
+    def get_cases(self):
+        raise NotImplementedError
+
+    def grow_data(self):
+        raise NotImplementedError
+
+    def request(self, user, url):
+        if user is None:
+            self.client.logout()
+        else:
+            # представление могло сменить пароль, а сессия хранит его хеш
+            user.refresh_from_db()
+            self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = self.client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        self.assertLess(response.status_code, 400, url)
+        return len(queries), elapsed
+
+    def check_budgets(self, data):
+        for name, (user, url, budget) in self.get_cases().items():
+            query_count, elapsed = self.request(user, url)
+            with self.subTest(name, data=data):
+                self.assertEqual(query_count, budget, f'{name}: {query_count} запросов вместо {budget}')
+                self.assertLess(elapsed, self.latency_budget)
+
+    def test_every_url_has_budget(self):
+        self.assertEqual(set(self.get_cases()), get_url_names(self.urlconf))
+
+    def test_budgets_do_not_grow_with_data(self):
+        self.check_budgets('small')
+        self.grow_data()
+        self.check_budgets('large')
@@ -1,3 +1,929 @@
-from django.test import TestCase
+import datetime
+import json
+import os
+import smtplib
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import Group
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from blog.models import Blog
+from main.bench import generate_mailing_data, run_dispatch_benchmark
+from main.cache import VERSION_KEY, VERSIONED_TIMEOUT, get_or_compute, make_key
+from main.form import ClientForm, MailingForm
+from main.importer import import_clients
+from main.log_writer import MailingLogWriter
+from main.models import MAILING_TIMEZONE, Client, Mailing, MailingLog, MailingLogRollup, MailingStats, SubscriptionState
+from main.management.commands.run_scheduler import Command as SchedulerCommand
+from main.pagination import encode_cursor
+from main.send_mailing import DeliveryResult, claim_due_subscriptions, renew_leases, send_mails
+from main.services import get_day_bounds, get_mailing_counts, get_mailing_history, get_mailing_log_page
+from main.smtp import close_connection_pool, is_temporary_error
+from main.smtp_sink import SMTPSink
+from main.testing import ViewBudgetMixin, add_mailing_logs, grow_mailing_data
+from users.models import User
+
+
+class DispatchTestCase(TestCase):
+    """Отправка рассылок через локальный SMTP-сервер"""
+
+    def setUp(self):
+        self.sink = SMTPSink(rejected={
+            'client0@bench.localhost': 450,
+            'client1@bench.localhost': 550,
+        }).start()
+        self.addCleanup(self.sink.stop)
+        settings_override = override_settings(
+            EMAIL_HOST=self.sink.server_address[0],
+            EMAIL_PORT=self.sink.port,
+            EMAIL_USE_SSL=False,
+            EMAIL_HOST_USER='test@localhost',
+            EMAIL_HOST_PASSWORD='test',
+            EMAIL_RATE_LIMIT=0,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        close_connection_pool()
+        self.addCleanup(close_connection_pool)
+
+    def count_send_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            send_mails(workers=4)
+        return len(queries)
+
+    def test_each_due_subscription_receives_one_message(self):
+        generate_mailing_data(clients=20, mailings=3)
+
+        send_mails(workers=4)
+
+        self.assertEqual(self.sink.message_count, 54)
+        self.assertEqual(MailingLog.objects.filter(log_status=MailingLog.STATUS_OK).count(), 54)
+        self.assertEqual(MailingLog.objects.filter(log_status=MailingLog.STATUS_FAILED).count(), 6)
+        self.assertFalse(SubscriptionState.objects.filter(next_send_at__lte=timezone.now()).exists())
+        self.assertFalse(SubscriptionState.objects.filter(leased_until__isnull=False).exists())
+
+    def test_subscriptions_are_not_sent_twice_within_period(self):
+        generate_mailing_data(clients=5, mailings=1)
+
+        send_mails(workers=2)
+        send_mails(workers=2)
+
+        self.assertEqual(self.sink.message_count, 3)
+        self.assertEqual(MailingLog.objects.count(), 5)
+
+    def test_connections_are_reused(self):
+        generate_mailing_data(clients=30, mailings=1)
+
+        send_mails(workers=1)
+
+        self.assertEqual(self.sink.connection_count, 1)
+
+    @override_settings(MAILING_RETRY_MAX_ATTEMPTS=2, MAILING_RETRY_BASE_DELAY=60)
+    def test_temporary_failures_are_retried_with_backoff(self):
+        generate_mailing_data(clients=2, mailings=1)
+        started = timezone.now()
+
+        send_mails(workers=1)
+
+        temporary = SubscriptionState.objects.get(client__email='client0@bench.localhost')
+        permanent = SubscriptionState.objects.get(client__email='client1@bench.localhost')
+        self.assertEqual(temporary.retries, 1)
+        self.assertLessEqual(temporary.next_send_at, started + datetime.timedelta(seconds=61))
+        self.assertEqual(permanent.retries, 0)
+        self.assertEqual(permanent.next_send_at, permanent.mailing.get_next_send_at(permanent.last_sent_at))
+
+        for retries in (2, 0):
+            SubscriptionState.objects.filter(pk=temporary.pk).update(next_send_at=timezone.now())
+            send_mails(workers=1)
+            temporary.refresh_from_db()
+            self.assertEqual(temporary.retries, retries)
+        self.assertEqual(temporary.attempts, 3)
+        self.assertGreater(temporary.next_send_at, timezone.now() + datetime.timedelta(hours=1))
+
+    def test_statistics_are_updated_incrementally(self):
+        owner, mailings, clients = generate_mailing_data(clients=10, mailings=2)
+
+        send_mails(workers=2)
+        SubscriptionState.objects.update(next_send_at=timezone.now())
+        send_mails(workers=2)
+
+        stats = MailingStats.objects.get(mailing=mailings[0])
+        self.assertEqual(stats.owner, owner)
+        self.assertEqual(stats.sent_count, 16)
+        self.assertEqual(stats.failed_count, 4)
+        self.assertEqual(MailingStats.objects.count(), 2)
+
+        self.client.force_login(owner)
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('main:mailing_stats'))
+        self.assertEqual(response.context['total'], {'sent_count': 32, 'failed_count': 8})
+
+    def test_error_classification(self):
+        self.assertTrue(is_temporary_error(smtplib.SMTPRecipientsRefused({'a@b.c': (451, b'try later')})))
+        self.assertFalse(is_temporary_error(smtplib.SMTPRecipientsRefused({'a@b.c': (550, b'no such user')})))
+        self.assertTrue(is_temporary_error(smtplib.SMTPDataError(421, b'busy')))
+        self.assertFalse(is_temporary_error(smtplib.SMTPSenderRefused(553, b'denied', 'a@b.c')))
+        self.assertTrue(is_temporary_error(smtplib.SMTPServerDisconnected()))
+        self.assertTrue(is_temporary_error(ConnectionRefusedError()))
+
+    def test_query_count_does_not_grow_with_subscribers(self):
+        generate_mailing_data(clients=3, mailings=1, owner_email='small@localhost')
+        small = self.count_send_queries()
+
+        generate_mailing_data(clients=20, mailings=2, owner_email='large@localhost')
+        large = self.count_send_queries()
+
+        self.assertEqual(small, large)
+
+
+class CountingDispatcher:
+    """Диспетчер без SMTP, запоминающий, кому ушли письма"""
+
+    def __init__(self):
+        self.delivered = []
+
+    def deliver(self, mailing, mailing_client):
+        time.sleep(0.01)
+        self.delivered.append(mailing_client.pk)
+        return DeliveryResult(MailingLog.STATUS_OK, 'отправлено', False)
+
+
+class DispatchInterruptionTestCase(TestCase):
+    """Ошибка записи результатов останавливает отправку, но не теряет уже отправленное"""
+
+    @override_settings(MAILING_DISPATCH_CHUNK_SIZE=10, MAILING_LOG_BATCH_SIZE=3)
+    def test_failed_flush_cancels_queued_deliveries(self):
+        generate_mailing_data(clients=50, mailings=1)
+        dispatcher = CountingDispatcher()
+        flush = MailingLogWriter.flush
+        calls = []
+
+        def failing_flush(writer):
+            calls.append(writer)
+            if len(calls) == 1:
+                raise DatabaseError('connection lost')
+            flush(writer)
+
+        with patch.object(MailingLogWriter, 'flush', failing_flush), self.assertRaises(DatabaseError):
+            send_mails(workers=2, dispatcher=dispatcher)
+
+        self.assertLessEqual(len(dispatcher.delivered), 10)
+        self.assertEqual(MailingLog.objects.count(), len(dispatcher.delivered))
+        self.assertEqual(
+            set(SubscriptionState.objects.filter(attempts=1).values_list('client_id', flat=True)),
+            set(dispatcher.delivered),
+        )
+
+
+class SchedulerLeaseTestCase(TestCase):
+    """Захват подписок планировщиком"""
+
+    def setUp(self):
+        self.owner, self.mailings, self.clients = generate_mailing_data(clients=3, mailings=2)
+
+    def test_claimed_subscriptions_are_not_claimed_again(self):
+        first = claim_due_subscriptions()
+        self.assertEqual(len(first), 6)
+        self.assertEqual(claim_due_subscriptions(), [])
+
+    def test_expired_lease_is_claimed_again(self):
+        now = timezone.now()
+        claim_due_subscriptions(now=now)
+        later = now + datetime.timedelta(seconds=settings.MAILING_LEASE_TTL + 1)
+
+        self.assertEqual(len(claim_due_subscriptions(now=later)), 6)
+
+    def test_lease_taken_by_another_worker_is_not_renewed(self):
+        claimed = claim_due_subscriptions()
+        SubscriptionState.objects.filter(pk=claimed[0].pk).update(lease_owner='other:1')
+
+        renewed = renew_leases(claimed)
+
+        self.assertEqual([state.pk for state in renewed], [state.pk for state in claimed[1:]])
+
+    def test_state_is_not_written_over_another_workers_lease(self):
+        claimed = claim_due_subscriptions()
+        SubscriptionState.objects.filter(pk=claimed[0].pk).update(lease_owner='other:1')
+
+        with MailingLogWriter() as log_writer:
+            for state in claimed:
+                log_writer.add(state, MailingLog.STATUS_OK, 'отправлено')
+
+        self.assertEqual(MailingLog.objects.count(), 6)
+        stolen = SubscriptionState.objects.get(pk=claimed[0].pk)
+        self.assertEqual((stolen.attempts, stolen.lease_owner), (0, 'other:1'))
+        self.assertEqual(SubscriptionState.objects.filter(attempts=1, lease_owner__isnull=True).count(), 5)
+
+    def test_scheduler_sleeps_while_subscriptions_are_leased(self):
+        claim_due_subscriptions()
+
+        sleep = SchedulerCommand()._get_sleep(60, None)
+
+        self.assertGreater(sleep, 0)
+        self.assertLessEqual(sleep, 60)
+
+    def test_shards_split_mailings(self):
+        claimed = [
+            {state.mailing_id for state in claim_due_subscriptions(shard=(index, 2))}
+            for index in range(2)
+        ]
+
+        self.assertEqual(claimed, [
+            {mailing.pk for mailing in self.mailings if mailing.pk % 2 == index} for index in range(2)
+        ])
+
+    def test_command_shard_is_validated(self):
+        with self.assertRaises(CommandError):
+            call_command('run_scheduler', '--once', '--shard', '2/2')
+
+
+class DispatchBenchmarkTestCase(TestCase):
+
+    def test_benchmark_reports_metrics_and_rolls_back(self):
+        result = run_dispatch_benchmark(clients=50, mailings=2, workers=4)
+
+        self.assertEqual(result['messages'], 100)
+        self.assertGreater(result['messages_per_second'], 0)
+        self.assertLessEqual(result['latency_p50'], result['latency_p99'])
+        self.assertGreater(result['peak_rss_kb'], 0)
+        self.assertFalse(MailingLog.objects.exists())
+
+    def test_benchmark_does_not_send_existing_mailings(self):
+        generate_mailing_data(clients=5, mailings=1, owner_email='real@localhost')
+
+        result = run_dispatch_benchmark(clients=10, mailings=1, keep_data=True)
+
+        self.assertEqual(result['messages'], 10)
+        self.assertFalse(SubscriptionState.objects.filter(
+            mailing__mailing_owner__email='real@localhost', last_sent_at__isnull=False,
+        ).exists())
+
+    def test_command_output(self):
+        out = StringIO()
+
+        call_command('bench_dispatch', clients=10, mailings=1, stdout=out)
+
+        self.assertIn('Отправлено писем: 10', out.getvalue())
+        self.assertIn('msg/s', out.getvalue())
+
+
+class LogCompactionTestCase(TestCase):
+
+    def setUp(self):
+        owner, mailings, clients = generate_mailing_data(clients=2, mailings=1)
+        self.mailing = mailings[0]
+        now = timezone.now()
+        for days_ago, client, status in ((100, clients[0], MailingLog.STATUS_OK),
+                                         (100, clients[0], MailingLog.STATUS_FAILED),
+                                         (100, clients[1], MailingLog.STATUS_OK),
+                                         (95, clients[1], MailingLog.STATUS_OK),
+                                         (1, clients[0], MailingLog.STATUS_OK)):
+            log = MailingLog.objects.create(log_status=status, log_client=client, log_mailing=self.mailing)
+            MailingLog.objects.filter(pk=log.pk).update(created_time=now - datetime.timedelta(days=days_ago))
+
+    def get_rollup_totals(self):
+        return MailingLogRollup.objects.aggregate(ok_count=Sum('ok_count'), failed_count=Sum('failed_count'))
+
+    def test_old_logs_are_folded_into_daily_counters(self):
+        out = StringIO()
+
+        call_command('compact_logs', days=90, stdout=out)
+
+        self.assertIn('Свернуто записей лога: 4', out.getvalue())
+        self.assertEqual(MailingLog.objects.count(), 1)
+        self.assertEqual(MailingLogRollup.objects.count(), 3)
+        self.assertEqual(self.get_rollup_totals(), {'ok_count': 3, 'failed_count': 1})
+
+    def test_compaction_is_repeatable(self):
+        call_command('compact_logs', days=90, stdout=StringIO())
+        call_command('compact_logs', days=0, stdout=StringIO())
+
+        self.assertFalse(MailingLog.objects.exists())
+        self.assertEqual(self.get_rollup_totals(), {'ok_count': 4, 'failed_count': 1})
+
+
+class MailingLogsViewTestCase(TestCase):
+
+    def setUp(self):
+        self.owner, mailings, self.clients = generate_mailing_data(clients=60, mailings=1)
+        self.mailing = mailings[0]
+        MailingLog.objects.bulk_create([
+            MailingLog(log_status=MailingLog.STATUS_OK, log_client=client, log_mailing=self.mailing, response='ok')
+            for client in self.clients * 2
+        ])
+        self.client.force_login(self.owner)
+
+    def test_pages_cover_all_logs_without_duplicates(self):
+        url = reverse('main:mailing_logs', args=[self.mailing.pk])
+        seen = []
+        cursor = None
+        while True:
+            response = self.client.get(url, {'cursor': cursor} if cursor else {})
+            page = response.context['logs']
+            seen.extend(log.pk for log in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+
+        self.assertEqual(len(seen), 120)
+        self.assertEqual(set(seen), set(MailingLog.objects.values_list('pk', flat=True)))
+
+    def test_page_query_count_does_not_depend_on_rows(self):
+        response = self.client.get(reverse('main:mailing_logs', args=[self.mailing.pk]))
+        cursor = response.context['logs'].next_cursor
+
+        with self.assertNumQueries(5):
+            self.client.get(reverse('main:mailing_logs', args=[self.mailing.pk]), {'cursor': cursor})
+
+    def test_history_is_read_from_stats(self):
+        today = timezone.now().astimezone(MAILING_TIMEZONE).date()
+        MailingStats.objects.create(mailing=self.mailing, owner=self.owner, date=today, sent_count=7, failed_count=2)
+
+        response = self.client.get(reverse('main:mailing_logs', args=[self.mailing.pk]))
+
+        self.assertEqual(response.context['history'], [{'date': today, 'ok_count': 7, 'failed_count': 2}])
+        self.assertEqual(get_mailing_history(self.mailing), response.context['history'])
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        first = self.client.get(reverse('main:mailing_logs', args=[self.mailing.pk])).context['logs']
+
+        for values in ([None, 1], [{}, 1], ['2024-01-01T00:00:00', []], 'garbage'):
+            cursor = encode_cursor(values) if values != 'garbage' else values
+            with self.subTest(values=values):
+                for url in (reverse('main:mailing_logs', args=[self.mailing.pk]), reverse('main:client_list')):
+                    self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 200)
+                page = self.client.get(reverse('main:mailing_logs', args=[self.mailing.pk]), {'cursor': cursor})
+                self.assertEqual([log.pk for log in page.context['logs']], [log.pk for log in first])
+
+    def test_export_streams_csv_and_jsonl(self):
+        url = reverse('main:mailing_logs_export', args=[self.mailing.pk])
+
+        response = self.client.get(url)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'created_time,log_status,log_client__email,response,attempts')
+        self.assertEqual(len(lines), 121)
+
+        response = self.client.get(url, {'format': 'jsonl'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 120)
+        self.assertEqual(rows[0]['log_status'], MailingLog.STATUS_OK)
+
+    def test_compacted_days_are_shown_after_detail_logs(self):
+        old_day = timezone.now() - datetime.timedelta(days=100)
+        MailingLog.objects.filter(log_client__in=self.clients[:55]).update(created_time=old_day)
+        call_command('compact_logs', days=90, stdout=StringIO())
+        self.assertEqual(MailingLog.objects.count(), 10)
+
+        url = reverse('main:mailing_logs', args=[self.mailing.pk])
+        rows = []
+        cursor = None
+        while True:
+            page = self.client.get(url, {'cursor': cursor} if cursor else {}).context['logs']
+            rows.extend(page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        rollups = [row for row in rows if isinstance(row, MailingLogRollup)]
+        self.assertEqual(len(rows), 65)
+        self.assertEqual(len(rollups), 55)
+        self.assertEqual(rows[10:], rollups)
+
+        response = self.client.get(reverse('main:mailing_logs_export', args=[self.mailing.pk]), {'format': 'jsonl'})
+        exported = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(exported), 65)
+        self.assertEqual(sum(row['attempts'] for row in exported), 120)
+
+    def test_other_users_are_redirected(self):
+        stranger = User.objects.create(email='stranger@localhost')
+        self.client.force_login(stranger)
+
+        response = self.client.get(reverse('main:mailing_logs_export', args=[self.mailing.pk]))
+
+        self.assertRedirects(response, reverse('main:mailing_list'))
+
+
+class ClientImportTestCase(TestCase):
+
+    def setUp(self):
+        self.owner, mailings, clients = generate_mailing_data(clients=1, mailings=1)
+        self.mailing = mailings[0]
+
+    def test_csv_import_dedupes_and_subscribes(self):
+        stream = StringIO(
+            'email,first_name,last_name\n'
+            'New@Example.com,Иван,Иванов\n'
+            'new@example.com ,Иван,Иванов\n'
+            'not-an-email,,\n'
+            'client0@bench.localhost,,\n'
+            'other@example.com,,\n'
+        )
+
+        result = import_clients(self.owner, stream, 'csv', mailing=self.mailing, batch_size=2)
+
+        self.assertEqual(result.processed, 5)
+        self.assertEqual(result.created, 2)
+        self.assertEqual(result.duplicates, 2)
+        self.assertEqual(result.rejected, [(4, 'not-an-email', 'некорректный адрес почты')])
+        self.assertEqual(Client.objects.filter(client_owner=self.owner).count(), 3)
+        self.assertEqual(self.mailing.mailing_clients.count(), 3)
+        self.assertEqual(SubscriptionState.objects.filter(mailing=self.mailing).count(), 3)
+        self.assertEqual(Client.objects.get(email='new@example.com').first_name, 'Иван')
+
+    def test_existing_email_matches_case_insensitively(self):
+        client = Client.objects.create(email='Ivan@Example.com', client_owner=self.owner)
+        self.assertEqual(client.email, 'ivan@example.com')
+
+        result = import_clients(self.owner, StringIO('email\nIVAN@example.com\n'), 'csv', mailing=self.mailing)
+
+        self.assertEqual(result.created, 0)
+        self.assertEqual(result.duplicates, 1)
+        self.assertEqual(Client.objects.filter(email='ivan@example.com').count(), 1)
+        self.assertTrue(self.mailing.mailing_clients.filter(pk=client.pk).exists())
+
+    def test_email_is_unique_per_owner_regardless_of_case(self):
+        Client.objects.create(email='ivan@example.com', client_owner=self.owner)
+
+        Client.objects.bulk_create([Client(email='IVAN@example.com', client_owner=self.owner)], ignore_conflicts=True)
+        form = ClientForm({'email': 'Ivan@Example.com'}, instance=Client(client_owner=self.owner))
+
+        self.assertEqual(Client.objects.filter(client_owner=self.owner, email__iexact='ivan@example.com').count(), 1)
+        self.assertFalse(form.is_valid())
+        self.assertIn('email', form.errors)
+
+    def test_jsonl_import_rejects_broken_lines(self):
+        stream = StringIO('{"email": "a@example.com"}\n{broken\n\n["b@example.com"]\n')
+
+        result = import_clients(self.owner, stream, 'jsonl')
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual([line for line, value, reason in result.rejected], [2, 4])
+
+    def test_import_view(self):
+        self.client.force_login(self.owner)
+        upload = SimpleUploadedFile('clients.csv', 'email\nview@example.com\n'.encode())
+
+        response = self.client.post(reverse('main:client_import'), {
+            'file': upload, 'import_format': 'csv', 'mailing': self.mailing.pk,
+        })
+
+        self.assertEqual(response.context['result'].created, 1)
+        self.assertTrue(self.mailing.mailing_clients.filter(email='view@example.com').exists())
+
+    def test_import_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as file:
+            file.write('{"email": "cmd@example.com"}\n')
+        self.addCleanup(os.remove, file.name)
+        out = StringIO()
+
+        call_command('import_clients', file.name, owner=self.owner.email, mailing=self.mailing.pk, stdout=out)
+
+        self.assertIn('добавлено 1', out.getvalue())
+        self.assertTrue(self.mailing.mailing_clients.filter(email='cmd@example.com').exists())
+
+
+@override_settings(CACHE_ENABLED=True, CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+})
+class VersionedCacheTestCase(TestCase):
+    """Версионированный кеш сбрасывается сигналами моделей"""
+
+    def setUp(self):
+        cache.clear()
+        self.owner, self.mailings, self.clients = generate_mailing_data(clients=3, mailings=2)
+
+    def test_service_cache_is_reset_on_mailing_change(self):
+        self.assertEqual(get_mailing_counts(), {'mailing_count': 2, 'active_count': 2})
+        with self.assertNumQueries(0):
+            get_mailing_counts()
+
+        self.mailings[0].mailing_status = Mailing.STATUS_DONE
+        self.mailings[0].save()
+        self.assertEqual(get_mailing_counts(), {'mailing_count': 2, 'active_count': 1})
+
+        self.mailings[1].delete()
+        self.assertEqual(get_mailing_counts(), {'mailing_count': 1, 'active_count': 0})
+
+    def test_home_page_is_reset_on_mailing_change(self):
+        response = self.client.get(reverse('blog:home_index'))
+        self.assertContains(response, '2')
+        with self.assertNumQueries(0):
+            self.client.get(reverse('blog:home_index'))
+
+        self.mailings[0].delete()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('blog:home_index'))
+        self.assertTrue(queries.captured_queries)
+
+    def test_only_version_keys_never_expire(self):
+        get_mailing_counts()
+        self.client.get(reverse('blog:home_index'))
+
+        for key, expires_at in cache._expire_info.items():
+            if VERSION_KEY.format('') not in key:
+                self.assertIsNotNone(expires_at, key)
+                self.assertLess(expires_at, time.time() + VERSIONED_TIMEOUT + 5)
+
+    def test_subscription_change_bumps_client_namespace(self):
+        key = make_key(('client',), 'clients')
+        self.mailings[0].mailing_clients.remove(self.clients[0])
+        self.assertNotEqual(make_key(('client',), 'clients'), key)
+
+
+@override_settings(CACHE_ENABLED=True, CACHES={
+    'default': {
+        'BACKEND': 'main.cache_backends.TieredCache',
+        'OPTIONS': {'L2': 'shared', 'L1_TIMEOUT': 5, 'L1_MAX_ENTRIES': 2},
+    },
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tiered-test'},
+})
+class TieredCacheTestCase(TestCase):
+    """Двухуровневый кеш и защита от одновременного пересчета"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_reads_hit_l1_then_l2(self):
+        cache.stats.clear()
+        cache.set('key', {'value': 1})
+        self.assertEqual(cache.get('key'), {'value': 1})
+
+        cache.clear_local()
+        self.assertEqual(cache.get('key'), {'value': 1})
+        self.assertEqual(cache.get('key'), {'value': 1})
+        self.assertIsNone(cache.get('missing'))
+
+        self.assertEqual(cache.get_stats(), {'l1_hits': 2, 'l1_misses': 2, 'l2_hits': 1, 'l2_misses': 1})
+
+    def test_l1_is_bounded_and_returns_copies(self):
+        for index in range(3):
+            cache.set(f'key{index}', [index])
+        cache.get('key0').append('changed')
+
+        self.assertEqual(cache.get('key0'), [0])
+        self.assertEqual(len(cache._l1), 2)
+
+    def test_entries_expire_from_l2(self):
+        cache.set('key', 1, 60)
+        cache.add('lock', 1, 30)
+
+        shared = caches['shared']
+        for key, timeout in (('key', 60), ('lock', 30)):
+            expires_at = shared._expire_info[shared.make_and_validate_key(key)]
+            self.assertAlmostEqual(expires_at - time.time(), timeout, delta=5)
+
+    def test_delete_reaches_both_tiers(self):
+        cache.set('key', 1)
+        cache.delete('key')
+        self.assertIsNone(cache.get('key'))
+        self.assertIsNone(caches['shared'].get('key'))
+
+    def test_only_one_thread_recomputes_missing_key(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(get_or_compute('hot', compute)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 5)
+
+
+class MailingAccessTestCase(TestCase):
+    """Проверка доступа к рассылке без повторных запросов"""
+
+    def setUp(self):
+        self.owner, self.mailings, self.clients = generate_mailing_data(clients=3, mailings=1)
+        self.mailing = self.mailings[0]
+        self.stranger = User.objects.create(email='stranger@localhost')
+        self.manager = User.objects.create(email='manager@localhost')
+        self.manager.groups.add(Group.objects.create(name='manager'))
+
+    def test_detail_is_visible_to_owner_and_manager_only(self):
+        url = reverse('main:mailing_detail', args=[self.mailing.pk])
+
+        self.client.force_login(self.stranger)
+        self.assertRedirects(self.client.get(url), reverse('main:mailing_list'), fetch_redirect_response=False)
+
+        self.client.force_login(self.manager)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_ownerless_detail_is_hidden_from_anonymous(self):
+        Mailing.objects.filter(pk=self.mailing.pk).update(mailing_owner=None)
+
+        response = self.client.get(reverse('main:mailing_detail', args=[self.mailing.pk]))
+
+        self.assertRedirects(response, reverse('main:mailing_list'), fetch_redirect_response=False)
+
+    def test_detail_loads_mailing_and_groups_once(self):
+        self.client.force_login(self.manager)
+        # рассылка с владельцем, сессия, пользователь, группы, первые подписчики и их число
+        with self.assertNumQueries(6):
+            self.client.get(reverse('main:mailing_detail', args=[self.mailing.pk]))
+
+
+class ListPaginationTestCase(TestCase):
+    """Списки выводятся по страницам за постоянное число запросов"""
+
+    def setUp(self):
+        self.owner, self.mailings, self.clients = generate_mailing_data(clients=45, mailings=2)
+        self.client.force_login(self.owner)
+
+    def get_query_count(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries.captured_queries)
+
+    def test_client_list_pages_through_all_clients(self):
+        seen = []
+        url = reverse('main:client_list')
+        while url:
+            response = self.client.get(url)
+            seen.extend(client.pk for client in response.context['object_list'])
+            page = response.context['page']
+            url = f"{reverse('main:client_list')}?cursor={page.next_cursor}" if page.has_next else None
+
+        self.assertEqual(sorted(seen), sorted(client.pk for client in self.clients))
+
+    def test_query_count_does_not_depend_on_rows(self):
+        urls = [
+            reverse('main:client_list'),
+            reverse('main:mailing_list'),
+            reverse('main:mailing_detail', args=[self.mailings[0].pk]),
+        ]
+        small = [self.get_query_count(url) for url in urls]
+
+        _, _, more_clients = generate_mailing_data(clients=60, mailings=3, owner_email=self.owner.email)
+        self.mailings[0].mailing_clients.add(*more_clients)
+
+        self.assertEqual([self.get_query_count(url) for url in urls], small)
+
+
+class ClientSearchTestCase(TestCase):
+    """Поиск подписчиков для формы рассылки"""
+
+    def setUp(self):
+        self.owner, self.mailings, self.clients = generate_mailing_data(clients=250, mailings=1)
+        self.client.force_login(self.owner)
+        self.stranger_client = Client.objects.create(
+            email='client1000@other.localhost', client_owner=User.objects.create(email='other@localhost'),
+        )
+
+    def search(self, **params):
+        return self.client.get(reverse('main:client_search'), params).json()
+
+    def test_prefix_search_is_limited_to_owner_clients(self):
+        data = self.search(q='CLIENT10')
+
+        self.assertEqual(
+            [item['text'] for item in data['results']],
+            [str(client) for client in Client.objects.filter(
+                client_owner=self.owner, email__startswith='client10').order_by('email')],
+        )
+        self.assertFalse(data['has_more'])
+
+    def test_results_are_paged_and_capped(self):
+        pages = [self.search(page=page) for page in range(1, 12)]
+
+        self.assertEqual(len(pages[0]['results']), 20)
+        self.assertTrue(pages[8]['has_more'])
+        self.assertFalse(pages[9]['has_more'])
+        self.assertEqual(pages[10]['results'], [])
+        self.assertEqual(len({item['id'] for page in pages for item in page['results']}), 200)
+
+    def test_search_marks_mailing_subscribers(self):
+        mailing = self.mailings[0]
+        mailing.mailing_clients.set(self.clients[:5])
+
+        data = self.search(q='client', mailing=mailing.pk)
+
+        self.assertEqual(
+            {item['id'] for item in data['results'] if item['subscribed']},
+            {client.pk for client in self.clients[:5]} & {item['id'] for item in data['results']},
+        )
+        self.client.force_login(self.stranger_client.client_owner)
+        self.assertEqual(self.client.get(reverse('main:client_search'), {'mailing': mailing.pk}).status_code, 404)
+
+    def test_form_renders_only_submitted_clients(self):
+        mailing = Mailing.objects.get(pk=self.mailings[0].pk)
+        mailing.mailing_clients.set(self.clients)
+        form = MailingForm(self.owner, instance=mailing)
+        form.initial['add_clients'] = [self.clients[0].pk]
+
+        html = str(form['add_clients'])
+
+        self.assertEqual(form.subscribers_count, len(self.clients))
+        self.assertIn(self.clients[0].email, html)
+        self.assertNotIn(self.clients[1].email, html)
+        self.assertIn(reverse('main:client_search'), html)
+        self.assertNotIn(self.clients[2].email, str(form['remove_clients']))
+
+    def test_submitted_clients_are_checked_in_one_query(self):
+        data = {'send_time': '10:00', 'send_frequency': Mailing.PERIOD_DAILY, 'mailing_status': Mailing.STATUS_CREATED,
+                'subject': 'Тема', 'body': 'Текст'}
+
+        form = MailingForm(self.owner, data={**data, 'add_clients': [client.pk for client in self.clients[:50]]})
+        with self.assertNumQueries(1):
+            self.assertTrue(form.is_valid())
+
+        form = MailingForm(self.owner, data={**data, 'add_clients': [self.stranger_client.pk]})
+        self.assertFalse(form.is_valid())
+        self.assertIn('__all__', form.errors)
+
+    def test_update_adds_and_removes_only_submitted_clients(self):
+        mailing = Mailing.objects.get(pk=self.mailings[0].pk)
+        mailing.mailing_clients.set(self.clients[:100])
+        data = {'send_time': '10:00', 'send_frequency': Mailing.PERIOD_DAILY, 'mailing_status': Mailing.STATUS_CREATED,
+                'subject': 'Тема', 'body': 'Текст',
+                'add_clients': [self.clients[150].pk], 'remove_clients': [self.clients[0].pk]}
+
+        response = self.client.post(reverse('main:mailing_update', args=[mailing.pk]), data)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            set(mailing.mailing_clients.values_list('pk', flat=True)),
+            {client.pk for client in self.clients[1:100]} | {self.clients[150].pk},
+        )
+
+
+class AdminChangelistTestCase(TestCase):
+    """Списки админки выполняются за постоянное число запросов"""
+
+    def setUp(self):
+        self.owner, self.mailings, self.clients = generate_mailing_data(clients=3, mailings=2)
+        add_mailing_logs(self.mailings, self.clients)
+        self.admin = User.objects.create(email='admin@localhost', is_staff=True, is_superuser=True)
+        self.client.force_login(self.admin)
+        self.urls = [reverse(f'admin:main_{model}_changelist') for model in ('mailing', 'client', 'mailinglog')]
+
+    def get_query_counts(self):
+        counts = []
+        for url in self.urls:
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            counts.append(len(queries.captured_queries))
+        return counts
+
+    def test_query_count_does_not_depend_on_rows(self):
+        small = self.get_query_counts()
+
+        _, mailings, clients = generate_mailing_data(clients=20, mailings=5, owner_email='more@localhost')
+        add_mailing_logs(mailings, clients)
+
+        self.assertEqual(self.get_query_counts(), small)
+
+    def test_mailing_list_shows_subscriber_count(self):
+        response = self.client.get(self.urls[0])
+        self.assertContains(response, '<td class="field-display_mailing_clients">3</td>', html=True)
+        self.assertNotContains(response, self.clients[0].email)
+
+    def test_log_list_filters_by_recent_range_without_date_scan(self):
+        today = timezone.localdate()
+        params = {'created_time__gte': str(today), 'created_time__lt': str(today + datetime.timedelta(days=1))}
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.urls[2], params)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cl'].result_list), MailingLog.objects.count())
+        self.assertFalse([query for query in queries.captured_queries if 'DISTINCT' in query['sql']])
+
+
+class IndexUsageTestCase(TestCase):
+    """Основные запросы читают таблицы по индексам"""
+
+    def setUp(self):
+        self.owner, self.mailings, self.clients = generate_mailing_data(clients=5, mailings=2)
+        add_mailing_logs(self.mailings, self.clients)
+        if connection.vendor == 'postgresql':
+            # на маленьких тестовых таблицах планировщик всегда выбирает полный просмотр
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def assertRunsWithIndex(self, run, marker, index_name):
+        """Проверяет план запроса, который действительно выполнила run(): первого, в SQL которого есть marker"""
+        with CaptureQueriesContext(connection) as queries:
+            run()
+        sql = next(query['sql'] for query in queries.captured_queries if marker in query['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+            plan = '\n'.join(' '.join(str(value) for value in row) for row in cursor.fetchall())
+        self.assertIn(index_name, plan)
+
+    def test_claim_reads_due_subscriptions_by_next_send_at(self):
+        # как в рабочей базе: срок отправки наступил у малой части подписок,
+        # без статистики планировщик SQLite начинает с таблицы рассылок
+        generate_mailing_data(clients=100, mailings=3, owner_email='due@localhost')
+        due_ids = SubscriptionState.objects.order_by('next_send_at', 'id').values_list('id', flat=True)[:10]
+        SubscriptionState.objects.exclude(id__in=list(due_ids)).update(
+            next_send_at=timezone.now() + datetime.timedelta(days=1),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        self.assertRunsWithIndex(
+            claim_due_subscriptions, '"next_send_at" <=', 'main_subscriptionstate_next_send_at',
+        )
+
+    def test_log_page_reads_by_mailing_and_time(self):
+        mailing = self.mailings[0]
+        first_page = get_mailing_log_page(mailing, page_size=2)
+
+        for cursor in (None, first_page.next_cursor):
+            self.assertRunsWithIndex(
+                lambda: get_mailing_log_page(mailing, cursor, page_size=2), 'FROM "main_mailinglog"',
+                'main_log_mailing_time_idx',
+            )
+
+    def test_import_looks_up_existing_clients_by_owner_and_email(self):
+        stream = StringIO('email\n' + '\n'.join(client.email for client in self.clients[:3]))
+        self.assertRunsWithIndex(
+            lambda: import_clients(self.owner, stream), '"email" IN', 'main_client_email_prefix_idx',
+        )
+
+    def test_daily_log_range(self):
+        start, end = get_day_bounds(timezone.localdate())
+        self.assertUsesIndex(
+            MailingLog.objects.filter(created_time__gte=start, created_time__lt=end),
+            'main_log_created_idx',
+        )
+
+    def test_mailing_and_client_queries(self):
+        self.assertUsesIndex(Mailing.objects.filter(mailing_status=Mailing.STATUS_STARTED),
+                             'main_mailing_started_idx')
+        self.assertUsesIndex(Client.objects.filter(client_owner=self.owner, email=self.clients[0].email),
+                             'main_client_email_prefix_idx')
+        if connection.vendor == 'postgresql':
+            # SQLite не использует индекс для LIKE с учетом регистра
+            self.assertUsesIndex(Client.objects.filter(client_owner=self.owner, email__startswith='client1'),
+                                 'main_client_email_prefix_idx')
+
+    def test_user_and_blog_queries(self):
+        self.assertUsesIndex(User.objects.filter(vrf_token='123456789012'), 'users_vrf_token_idx')
+        self.assertUsesIndex(Blog.objects.filter(is_published=True).order_by('-creation_date')[:12],
+                             'blog_published_date_idx')
+
+
+@override_settings(CACHE_ENABLED=False)
+class MainViewBudgetTestCase(ViewBudgetMixin, TestCase):
+    """Бюджеты запросов и времени ответа страниц рассылок и клиентов"""
+    urlconf = 'main.urls'
+
+    def setUp(self):
+        self.owner, self.mailings, self.clients = generate_mailing_data(clients=3, mailings=2)
+        add_mailing_logs(self.mailings, self.clients)
+
+    def grow_data(self):
+        _, clients = grow_mailing_data(self.owner)
+        self.mailings[0].mailing_clients.add(*clients)
+        add_mailing_logs(self.mailings[:1], clients)
+
+    def get_cases(self):
+        mailing, client = self.mailings[0], self.clients[0]
+        owner = self.owner
+        return {
+            'mailing_list': (owner, reverse('main:mailing_list'), 4),
+            'mailing_create': (owner, reverse('main:mailing_create'), 3),
+            'mailing_update': (owner, reverse('main:mailing_update', args=[mailing.pk]), 4),
+            'mailing_detail': (owner, reverse('main:mailing_detail', args=[mailing.pk]), 5),
+            'mailing_delete': (owner, reverse('main:mailing_delete', args=[mailing.pk]), 3),
+            'mailing_logs': (owner, reverse('main:mailing_logs', args=[mailing.pk]), 6),
+            'mailing_logs_export': (owner, reverse('main:mailing_logs_export', args=[mailing.pk]), 5),
+            'mailing_stats': (owner, reverse('main:mailing_stats'), 6),
+            'client_list': (owner, reverse('main:client_list'), 3),
+            'client_create': (owner, reverse('main:client_create'), 2),
+            'client_import': (owner, reverse('main:client_import'), 3),
+            'client_search': (owner, reverse('main:client_search') + '?q=client', 3),
+            'client_update': (owner, reverse('main:client_update', args=[client.pk]), 3),
+            'client_detail': (owner, reverse('main:client_detail', args=[client.pk]), 3),
+            'client_delete': (owner, reverse('main:client_delete', args=[client.pk]), 3),
+        }
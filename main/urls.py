@@ -1,8 +1,9 @@
 from django.urls import path
 from main.apps import MainConfig
 from main.views import (MailingListView, MailingCreateView, MailingUpdateView, MailingDetailView, MailingDeleteView,
-                        ClientListView, ClientCreateView, ClientUpdateView, ClientDetailView, ClientDeleteView,
-                        mailing_logs)
+                        ClientListView, ClientCreateView, ClientImportView, ClientUpdateView, ClientDetailView,
+                        ClientDeleteView, client_search,
+                        mailing_logs, mailing_logs_export, mailing_stats)
 
 app_name = MainConfig.name
 
@@ -13,8 +14,12 @@ urlpatterns = [
     path('mailing/<int:pk>/detail/', MailingDetailView.as_view(), name='mailing_detail'),
     path('mailing/<int:pk>/delete/', MailingDeleteView.as_view(), name='mailing_delete'),
     path('mailing/<int:mailing_id>/logs', mailing_logs, name='mailing_logs'),
+    path('mailing/<int:mailing_id>/logs/export/', mailing_logs_export, name='mailing_logs_export'),
+    path('stats/', mailing_stats, name='mailing_stats'),
     path('client/', ClientListView.as_view(), name='client_list'),
     path('client_create/', ClientCreateView.as_view(), name='client_create'),
+    path('client_import/', ClientImportView.as_view(), name='client_import'),
+    path('client/search/', client_search, name='client_search'),
     path('client/<int:pk>/update/', ClientUpdateView.as_view(), name='client_update'),
     path('client/<int:pk>/detail/', ClientDetailView.as_view(), name='client_detail'),
     path('client/<int:pk>/delete/', ClientDeleteView.as_view(), name='client_delete'),
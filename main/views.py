@@ -1,15 +1,34 @@
+import csv
+import datetime
+import io
+import itertools
+import json
+
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin, PermissionRequiredMixin
-from django.http import Http404
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Exists, OuterRef, Q, Sum
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy, reverse
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
+from django.utils import timezone
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, FormView
+
+from main.form import MailingForm, ClientForm, ClientImportForm
+from main.importer import import_clients
+from main.mixins import CachedObjectMixin, KeysetListMixin
+from main.models import MAILING_TIMEZONE, Mailing, Client, MailingStats
+from main.services import LOG_EXPORT_COLUMNS, get_mailing_history, get_mailing_log_page, iter_mailing_log_rows
+from users.roles import can_manage_mailings, is_content_manager, is_manager
 
-from main.form import MailingForm, ClientForm
-from main.models import Mailing, Client, MailingLog
+LOGS_PAGE_SIZE = 50
+SUBSCRIBERS_PREVIEW_SIZE = 100
+CLIENT_SEARCH_PAGE_SIZE = 20
+CLIENT_SEARCH_MAX_RESULTS = 200
+EXPORT_CHUNK_SIZE = 2000
 
 
-class MailingListView(ListView):
+class MailingListView(KeysetListMixin, ListView):
     model = Mailing
     extra_context = {
         'title': 'Рассылки'
@@ -17,10 +36,11 @@ class MailingListView(ListView):
 
     def get_queryset(self):
         user = self.request.user
-        if user.groups.filter(name='manager').exists() or user.is_superuser:
-            queryset = super().get_queryset()
-        else:
-            queryset = super().get_queryset().filter(
+        queryset = super().get_queryset().select_related('mailing_owner').only(
+            'subject', 'send_frequency', 'send_time', 'mailing_status', 'mailing_owner__email'
+        )
+        if not can_manage_mailings(user):
+            queryset = queryset.filter(
                 mailing_owner=user.pk
             )
         return queryset
@@ -35,7 +55,7 @@ class MailingCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
 
     def test_func(self):
         user = self.request.user
-        if not user.groups.filter(name='manager').exists() and not user.groups.filter(name='content_manager').exists():
+        if not is_manager(user) and not is_content_manager(user):
             return True
         return False
 
@@ -58,7 +78,7 @@ class MailingCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
         return redirect(reverse_lazy('main:mailing_list'))
 
 
-class MailingUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class MailingUpdateView(LoginRequiredMixin, UserPassesTestMixin, CachedObjectMixin, UpdateView):
     model = Mailing
     form_class = MailingForm
     extra_context = {
@@ -74,7 +94,7 @@ class MailingUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         user = self.request.user
         mailing = self.get_object()
 
-        if mailing.mailing_owner == user or user.groups.filter(name='manager').exists() or user.is_superuser:
+        if mailing.mailing_owner_id == user.pk or can_manage_mailings(user):
             return True
         return False
 
@@ -85,17 +105,25 @@ class MailingUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         return reverse('main:mailing_detail', args=[self.object.pk])
 
 
-class MailingDetailView(DetailView, UserPassesTestMixin):
+class MailingDetailView(LoginRequiredMixin, UserPassesTestMixin, CachedObjectMixin, DetailView):
     model = Mailing
+    queryset = Mailing.objects.select_related('mailing_owner')
     extra_context = {
         'title': 'Информация о рассылке'
     }
 
+    def get_context_data(self, **kwargs):
+        """Показываем только первых подписчиков, у рассылки их могут быть сотни тысяч"""
+        subscribers = self.object.mailing_clients.order_by('pk').only('email')
+        kwargs['subscribers'] = subscribers[:SUBSCRIBERS_PREVIEW_SIZE]
+        kwargs['subscribers_count'] = subscribers.count()
+        return super().get_context_data(**kwargs)
+
     def test_func(self):
         user = self.request.user
         mailing = self.get_object()
 
-        if mailing.mailing_owner == user or user.groups.filter(name='manager').exists() or user.is_superuser:
+        if mailing.mailing_owner_id == user.pk or can_manage_mailings(user):
             return True
         return False
 
@@ -103,7 +131,7 @@ class MailingDetailView(DetailView, UserPassesTestMixin):
         return redirect(reverse_lazy('main:mailing_list'))
 
 
-class MailingDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+class MailingDeleteView(LoginRequiredMixin, UserPassesTestMixin, CachedObjectMixin, DeleteView):
     model = Mailing
     success_url = reverse_lazy('main:mailing_list')
     extra_context = {
@@ -114,7 +142,7 @@ class MailingDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
         user = self.request.user
         mailing = self.get_object()
 
-        if mailing.mailing_owner == user or user.is_superuser:
+        if mailing.mailing_owner_id == user.pk or user.is_superuser:
             return True
         return False
 
@@ -122,23 +150,85 @@ class MailingDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
         return redirect(reverse_lazy('main:mailing_list'))
 
 
+def can_view_mailing_logs(user, mailing):
+    return mailing.mailing_owner_id == user.pk or can_manage_mailings(user)
+
+
 @login_required
 def mailing_logs(request, mailing_id):
+    """Логи рассылки и свернутые сводки с постраничным выводом по ключу"""
+    mailing = get_object_or_404(Mailing, pk=mailing_id)
+    if not can_view_mailing_logs(request.user, mailing):
+        return redirect('main:mailing_list')
+
+    cursor = request.GET.get('cursor')
+    context = {
+        'mailing': mailing,
+        'logs': get_mailing_log_page(mailing, cursor, LOGS_PAGE_SIZE),
+        'history': None if cursor else get_mailing_history(mailing),
+    }
+    return render(request, 'main/mailing_logs.html', context)
+
+
+class Echo:
+    """Псевдофайл для csv.writer, возвращающий записанную строку"""
+
+    def write(self, value):
+        return value
+
+
+@login_required
+def mailing_logs_export(request, mailing_id):
+    """Потоковая выгрузка всех логов и сводок рассылки в CSV или JSONL (?format=jsonl)"""
     mailing = get_object_or_404(Mailing, pk=mailing_id)
-    logs = MailingLog.objects.filter(log_mailing=mailing).order_by('-created_time')
-
-    if (mailing.mailing_owner == request.user or request.user.is_superuser
-            or request.user.groups.filter(name='manager').exists()):
-        context = {
-            'mailing': mailing,
-            'logs': logs,
-        }
-        return render(request, 'main/mailing_logs.html', context)
+    if not can_view_mailing_logs(request.user, mailing):
+        return redirect('main:mailing_list')
+
+    columns = LOG_EXPORT_COLUMNS
+    rows = iter_mailing_log_rows(mailing, EXPORT_CHUNK_SIZE)
+
+    if request.GET.get('format') == 'jsonl':
+        lines = (json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+                 for row in rows)
+        response = StreamingHttpResponse(lines, content_type='application/x-ndjson; charset=utf-8')
+        extension = 'jsonl'
     else:
-        return redirect("mail:mailing_list")
+        writer = csv.writer(Echo())
+        lines = itertools.chain([writer.writerow(columns)], (writer.writerow(row) for row in rows))
+        response = StreamingHttpResponse(lines, content_type='text/csv; charset=utf-8')
+        extension = 'csv'
+    response['Content-Disposition'] = f'attachment; filename="mailing_{mailing.pk}_logs.{extension}"'
+    return response
+
+
+@login_required
+def mailing_stats(request):
+    """Статистика рассылок, построенная только по предагрегированной таблице MailingStats"""
+    user = request.user
+    stats = MailingStats.objects.all()
+    show_owners = can_manage_mailings(user)
+    if not show_owners:
+        stats = stats.filter(owner=user)
+
+    since = timezone.now().astimezone(MAILING_TIMEZONE).date() - datetime.timedelta(days=30)
+    context = {
+        'title': 'Статистика рассылок',
+        'total': stats.aggregate(sent_count=Sum('sent_count'), failed_count=Sum('failed_count')),
+        'by_mailing': stats.values('mailing_id', 'mailing__subject').annotate(
+            sent_count=Sum('sent_count'), failed_count=Sum('failed_count'),
+        ).order_by('-sent_count'),
+        'by_day': stats.filter(date__gte=since).values('date').annotate(
+            sent_count=Sum('sent_count'), failed_count=Sum('failed_count'),
+        ).order_by('-date'),
+    }
+    if show_owners:
+        context['by_owner'] = stats.values('owner__email').annotate(
+            sent_count=Sum('sent_count'), failed_count=Sum('failed_count'),
+        ).order_by('-sent_count')
+    return render(request, 'main/mailing_stats.html', context)
 
 
-class ClientListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
+class ClientListView(LoginRequiredMixin, UserPassesTestMixin, KeysetListMixin, ListView):
     model = Client
     extra_context = {
         'title': 'Мои клиенты'
@@ -152,10 +242,11 @@ class ClientListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
 
     def get_queryset(self):
         user = self.request.user
-        if user.is_superuser:
-            queryset = super().get_queryset()
-        else:
-            queryset = super().get_queryset().filter(
+        queryset = super().get_queryset().select_related('client_owner').only(
+            'email', 'first_name', 'last_name', 'surname', 'comment', 'client_owner__email'
+        )
+        if not user.is_superuser:
+            queryset = queryset.filter(
                 client_owner=user.pk
             )
         return queryset
@@ -183,14 +274,90 @@ class ClientCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
     def get_success_url(self):
         return reverse('main:client_detail', args=[self.object.pk])
 
+    def get_form_kwargs(self):
+        """Владелец нужен форме уже при проверке почты на повтор"""
+        kwargs = super().get_form_kwargs()
+        kwargs['instance'] = Client(client_owner=self.request.user)
+        return kwargs
+
     def form_valid(self, form):
-        self.object = form.save(commit=False)
-        self.object.client_owner = self.request.user
-        self.object.save()
+        self.object = form.save()
         return redirect(self.get_success_url())
 
 
-class ClientUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class ClientImportView(LoginRequiredMixin, UserPassesTestMixin, FormView):
+    form_class = ClientImportForm
+    template_name = 'main/client_import.html'
+    extra_context = {
+        'title': 'Импорт клиентов'
+    }
+
+    def test_func(self):
+        user = self.request.user
+        if not user.is_staff or user.is_superuser:
+            return True
+        return False
+
+    def handle_no_permission(self):
+        return redirect(reverse_lazy('main:mailing_list'))
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['user'] = self.request.user
+        return kwargs
+
+    def form_valid(self, form):
+        stream = io.TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8-sig', newline='')
+        result = import_clients(
+            owner=self.request.user,
+            stream=stream,
+            import_format=form.cleaned_data['import_format'],
+            mailing=form.cleaned_data['mailing'],
+        )
+        return self.render_to_response(self.get_context_data(form=form, result=result))
+
+
+@login_required
+def client_search(request):
+    """
+    Поиск клиентов для выбора подписчиков рассылки: начало почты, имени или фамилии,
+    по CLIENT_SEARCH_PAGE_SIZE результатов на страницу, всего не больше CLIENT_SEARCH_MAX_RESULTS.
+    С ?mailing=<id> ищет среди клиентов владельца рассылки и отмечает ее подписчиков.
+    """
+    owner_id = request.user.pk
+    mailing_id = request.GET.get('mailing', '')
+    if mailing_id.isdigit():
+        mailing = get_object_or_404(Mailing.objects.only('mailing_owner_id'), pk=mailing_id)
+        if mailing.mailing_owner_id != request.user.pk and not request.user.is_staff:
+            raise Http404
+        owner_id = mailing.mailing_owner_id
+
+    query = request.GET.get('q', '').strip()
+    page = request.GET.get('page', '')
+    page = max(int(page), 1) if page.isdigit() else 1
+    start = (page - 1) * CLIENT_SEARCH_PAGE_SIZE
+    end = min(start + CLIENT_SEARCH_PAGE_SIZE, CLIENT_SEARCH_MAX_RESULTS)
+
+    clients = Client.objects.filter(client_owner=owner_id).only('email', 'first_name', 'last_name')
+    if query:
+        # почта хранится в нижнем регистре, поэтому для нее подходит индекс по префиксу
+        clients = clients.filter(
+            Q(email__startswith=query.lower()) | Q(first_name__istartswith=query) | Q(last_name__istartswith=query)
+        )
+    if mailing_id.isdigit():
+        subscriptions = Mailing.mailing_clients.through.objects.filter(mailing_id=mailing_id, client_id=OuterRef('pk'))
+        clients = clients.annotate(subscribed=Exists(subscriptions))
+    found = list(clients.order_by('email', 'pk')[start:end + 1]) if start < end else []
+    return JsonResponse({
+        'results': [
+            {'id': client.pk, 'text': str(client), 'subscribed': getattr(client, 'subscribed', False)}
+            for client in found[:end - start]
+        ],
+        'has_more': len(found) > end - start and end < CLIENT_SEARCH_MAX_RESULTS,
+    })
+
+
+class ClientUpdateView(LoginRequiredMixin, UserPassesTestMixin, CachedObjectMixin, UpdateView):
     model = Client
     form_class = ClientForm
     extra_context = {
@@ -201,13 +368,13 @@ class ClientUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         user = self.request.user
         mailing = self.get_object()
 
-        if mailing.client_owner == user or user.is_staff:
+        if mailing.client_owner_id == user.pk or user.is_staff:
             return True
         return False
 
     def get_object(self, queryset=None):
         self.object = super().get_object(queryset)
-        if self.object.client_owner != self.request.user and not self.request.user.is_staff:
+        if self.object.client_owner_id != self.request.user.pk and not self.request.user.is_staff:
             raise Http404
         return self.object
 
@@ -220,6 +387,7 @@ class ClientUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
 
 class ClientDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
     model = Client
+    queryset = Client.objects.select_related('client_owner')
     extra_context = {
         'title': 'Информация о клиенте'
     }
@@ -0,0 +1,90 @@
+// Выбор подписчиков рассылки: варианты подгружаются с сервера по мере ввода.
+// Найденные клиенты попадают в список на добавление, а уже подписанные — в список на удаление.
+// Двойной щелчок убирает клиента из списка, отправляются только эти изменения.
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('select[data-search-url]').forEach(function (select) {
+        var removeSelect = select.form.querySelector('select[data-client-picker="remove_clients"]');
+        var input = document.createElement('input');
+        input.type = 'search';
+        input.className = 'form-control mb-1';
+        input.placeholder = 'Начните вводить почту, имя или фамилию';
+        var results = document.createElement('div');
+        results.className = 'list-group mb-2';
+        select.parentNode.insertBefore(input, select);
+        select.parentNode.insertBefore(results, select.nextSibling);
+
+        var url = new URL(select.dataset.searchUrl, window.location.href);
+        var timer = null;
+        var page = 1;
+
+        function pickClient(item) {
+            var target = item.subscribed && removeSelect ? removeSelect : select;
+            var exists = Array.prototype.some.call(target.options, function (option) {
+                return option.value === String(item.id);
+            });
+            if (!exists) {
+                target.appendChild(new Option(item.text, item.id, true, true));
+            }
+        }
+
+        function load(append) {
+            url.searchParams.set('q', input.value);
+            url.searchParams.set('page', page);
+            fetch(url, {credentials: 'same-origin'})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    if (!append) {
+                        results.innerHTML = '';
+                    }
+                    var more = results.querySelector('.client-search-more');
+                    if (more) {
+                        more.remove();
+                    }
+                    data.results.forEach(function (item) {
+                        var button = document.createElement('button');
+                        button.type = 'button';
+                        button.className = 'list-group-item list-group-item-action';
+                        button.textContent = item.subscribed ? item.text + ' (подписан, убрать)' : item.text;
+                        button.addEventListener('click', function () { pickClient(item); });
+                        results.appendChild(button);
+                    });
+                    if (data.has_more) {
+                        var next = document.createElement('button');
+                        next.type = 'button';
+                        next.className = 'list-group-item list-group-item-light client-search-more';
+                        next.textContent = 'Показать еще';
+                        next.addEventListener('click', function () {
+                            page += 1;
+                            load(true);
+                        });
+                        results.appendChild(next);
+                    }
+                });
+        }
+
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () {
+                page = 1;
+                load(false);
+            }, 250);
+        });
+
+        [select, removeSelect].forEach(function (picker) {
+            if (!picker) {
+                return;
+            }
+            picker.addEventListener('dblclick', function (event) {
+                if (event.target.tagName === 'OPTION') {
+                    event.target.remove();
+                }
+            });
+            // Отправляются только выбранные option, поэтому перед отправкой выделяем все
+            select.form.addEventListener('submit', function () {
+                Array.prototype.forEach.call(picker.options, function (option) {
+                    option.selected = true;
+                });
+            });
+        });
+    });
+});
@@ -1,4 +1,12 @@
 from django.contrib import admin
-from users.models import User
+from users.models import User, OutgoingEmail
 
-admin.site.register(User)
\ No newline at end of file
+admin.site.register(User)
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'recipient', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('recipient',)
+    exclude = ('body',)
@@ -0,0 +1,43 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import close_old_connections
+
+from main.smtp import close_connection_pool
+from users.utils import deliver_outbox
+
+
+class Command(BaseCommand):
+    """
+    Отправка писем из очереди OutgoingEmail (регистрация, смена пароля).
+    Работает постоянно и проверяет очередь раз в --interval секунд,
+    с --once отправляет накопившиеся письма и завершается.
+    """
+    help = 'Отправка писем из очереди'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='отправить накопившиеся письма и завершиться')
+        parser.add_argument('--interval', type=float, default=settings.OUTBOX_POLL_INTERVAL,
+                            help='пауза между проверками очереди в секундах')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            self.stdout.write(f'Обработано писем: {deliver_outbox()}')
+            return
+
+        self._stop = threading.Event()
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        try:
+            while not self._stop.is_set():
+                close_old_connections()
+                deliver_outbox()
+                self._stop.wait(options['interval'])
+        finally:
+            close_connection_pool()
+
+    def _request_stop(self, signum, frame):
+        self._stop.set()
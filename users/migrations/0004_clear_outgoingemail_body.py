@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+def clear_final_bodies(apps, schema_editor):
+    OutgoingEmail = apps.get_model('users', 'OutgoingEmail')
+    OutgoingEmail.objects.exclude(status='pending').exclude(body='').update(body='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_final_bodies, migrations.RunPython.noop),
+    ]
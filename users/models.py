@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 
 from main.models import NULLABLE
 
@@ -22,3 +23,35 @@ class User(AbstractUser):
         permissions = [
             ('set_status_is_active', 'Can change the status of user'),
         ]
+        indexes = [
+            models.Index(fields=('vrf_token',), condition=models.Q(vrf_token__isnull=False),
+                         name='users_vrf_token_idx'),
+        ]
+
+
+class OutgoingEmail(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUSES = (
+        (STATUS_PENDING, 'Ожидает отправки'),
+        (STATUS_SENT, 'Отправлено'),
+        (STATUS_FAILED, 'Ошибка'),
+    )
+
+    recipient = models.EmailField(verbose_name='получатель')
+    subject = models.CharField(max_length=200, verbose_name='тема письма')
+    body = models.TextField(verbose_name='тело письма')
+    status = models.CharField(max_length=20, choices=STATUSES, default=STATUS_PENDING, verbose_name='статус')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='количество попыток')
+    next_attempt_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name='следующая попытка')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='создано')
+    sent_at = models.DateTimeField(**NULLABLE, verbose_name='отправлено')
+    last_error = models.TextField(**NULLABLE, verbose_name='последняя ошибка')
+
+    def __str__(self):
+        return f'{self.subject} для {self.recipient} ({self.status})'
+
+    class Meta:
+        verbose_name = 'исходящее письмо'
+        verbose_name_plural = 'исходящие письма'
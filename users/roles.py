@@ -0,0 +1,39 @@
+MANAGER = 'manager'
+CONTENT_MANAGER = 'content_manager'
+
+
+def get_group_names(user):
+    """
+    Названия групп пользователя. Загружаются одним запросом и запоминаются
+    на объекте пользователя, который создается заново для каждого запроса.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    group_names = getattr(user, '_group_names', None)
+    if group_names is None:
+        group_names = frozenset(user.groups.values_list('name', flat=True))
+        user._group_names = group_names
+    return group_names
+
+
+def reset_group_names(user):
+    """Сбрасывает запомненные группы после изменения членства"""
+    user.__dict__.pop('_group_names', None)
+
+
+def is_manager(user):
+    return MANAGER in get_group_names(user)
+
+
+def is_content_manager(user):
+    return CONTENT_MANAGER in get_group_names(user)
+
+
+def can_manage_mailings(user):
+    """Менеджер или суперпользователь видит и меняет чужие рассылки"""
+    return user.is_superuser or is_manager(user)
+
+
+def can_manage_blog(user):
+    """Контент-менеджер или суперпользователь управляет статьями блога"""
+    return user.is_superuser or is_content_manager(user)
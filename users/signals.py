@@ -0,0 +1,11 @@
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from users.models import User
+from users.roles import reset_group_names
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def reset_user_roles(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, User):
+        reset_group_names(instance)
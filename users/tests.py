@@ -1,3 +1,154 @@
-from django.test import TestCase
+import datetime
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from main.smtp import close_connection_pool
+from main.smtp_sink import SMTPSink
+from main.testing import ViewBudgetMixin
+from users.models import User, OutgoingEmail
+from users.roles import can_manage_blog, can_manage_mailings, is_content_manager, is_manager
+from users.utils import claim_outgoing_emails, deliver_outbox, renew_lease, send_mail
+
+
+class OutboxTestCase(TestCase):
+    """Очередь писем пользователям"""
+
+    def setUp(self):
+        self.sink = SMTPSink(rejected={'later@localhost': 451, 'never@localhost': 550}).start()
+        self.addCleanup(self.sink.stop)
+        settings_override = override_settings(
+            EMAIL_HOST=self.sink.server_address[0],
+            EMAIL_PORT=self.sink.port,
+            EMAIL_USE_SSL=False,
+            EMAIL_HOST_USER='test@localhost',
+            EMAIL_HOST_PASSWORD='test',
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        close_connection_pool()
+        self.addCleanup(close_connection_pool)
+
+    def test_registration_only_enqueues_email(self):
+        response = self.client.post(reverse('users:register'), {
+            'email': 'new@localhost', 'password1': 'Sup3r-secret!', 'password2': 'Sup3r-secret!',
+        })
+
+        self.assertRedirects(response, reverse('users:login'))
+        self.assertEqual(self.sink.connection_count, 0)
+        outgoing_email = OutgoingEmail.objects.get()
+        self.assertEqual(outgoing_email.recipient, 'new@localhost')
+        self.assertIn(User.objects.get(email='new@localhost').vrf_token, outgoing_email.body)
+
+    def test_reset_password_enqueues_email(self):
+        User.objects.create(email='user@localhost')
+
+        response = self.client.post(reverse('users:reset_password'), {'email': 'user@localhost'})
+
+        self.assertRedirects(response, reverse('users:login'))
+        self.assertEqual(OutgoingEmail.objects.get().recipient, 'user@localhost')
+
+    def test_outbox_is_delivered_over_one_connection(self):
+        for index in range(5):
+            send_mail(to=f'user{index}@localhost', theme='Тема', message='Текст')
+
+        out = StringIO()
+        call_command('run_outbox', once=True, stdout=out)
+
+        self.assertIn('Обработано писем: 5', out.getvalue())
+        self.assertEqual(self.sink.message_count, 5)
+        self.assertEqual(self.sink.connection_count, 1)
+        self.assertFalse(OutgoingEmail.objects.exclude(status=OutgoingEmail.STATUS_SENT).exists())
+        self.assertFalse(OutgoingEmail.objects.exclude(body='').exists())
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2)
+    def test_temporary_errors_are_retried(self):
+        later = send_mail(to='later@localhost', theme='Тема', message='Текст')
+        never = send_mail(to='never@localhost', theme='Тема', message='Текст')
+
+        deliver_outbox()
+        later.refresh_from_db()
+        never.refresh_from_db()
+        self.assertEqual(later.status, OutgoingEmail.STATUS_PENDING)
+        self.assertEqual(later.body, 'Текст')
+        self.assertGreater(later.next_attempt_at, timezone.now())
+        self.assertEqual(never.status, OutgoingEmail.STATUS_FAILED)
+        self.assertEqual(never.body, '')
+
+        OutgoingEmail.objects.filter(pk=later.pk).update(next_attempt_at=timezone.now())
+        deliver_outbox()
+        later.refresh_from_db()
+        self.assertEqual(later.status, OutgoingEmail.STATUS_FAILED)
+        self.assertEqual(later.attempts, 2)
+
+    def test_email_reclaimed_by_another_worker_is_skipped(self):
+        send_mail(to='user@localhost', theme='Тема', message='Текст')
+        outgoing_email, = claim_outgoing_emails()
+        reclaimed_until = timezone.now() + datetime.timedelta(minutes=1)
+        OutgoingEmail.objects.update(next_attempt_at=reclaimed_until)
+
+        self.assertFalse(renew_lease(outgoing_email))
+        self.assertEqual(OutgoingEmail.objects.get().next_attempt_at, reclaimed_until)
+
+
+class RolesTestCase(TestCase):
+    """Роли пользователя загружаются одним запросом"""
+
+    def setUp(self):
+        self.user = User.objects.create(email='manager@localhost')
+        self.user.groups.add(Group.objects.create(name='manager'))
+        self.user = User.objects.get(pk=self.user.pk)
+
+    def test_groups_are_loaded_once(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(is_manager(self.user))
+            self.assertFalse(is_content_manager(self.user))
+            self.assertTrue(can_manage_mailings(self.user))
+            self.assertFalse(can_manage_blog(self.user))
+
+    def test_roles_are_reset_on_group_change(self):
+        self.assertFalse(is_content_manager(self.user))
+        self.user.groups.add(Group.objects.create(name='content_manager'))
+        self.assertTrue(is_content_manager(self.user))
+        self.user.groups.clear()
+        self.assertFalse(is_manager(self.user))
+
+
+@override_settings(CACHE_ENABLED=False)
+class UsersViewBudgetTestCase(ViewBudgetMixin, TestCase):
+    """Бюджеты запросов и времени ответа страниц пользователей"""
+    urlconf = 'users.urls'
+
+    def setUp(self):
+        self.staff = User.objects.create(email='staff@localhost', is_staff=True)
+        self.user = User.objects.create(email='user@localhost')
+        self.pending = User.objects.create(email='pending@localhost', is_active=False)
+        self.member = User.objects.create(email='member@localhost')
+
+    def grow_data(self):
+        User.objects.bulk_create([User(email=f'user{index}@localhost') for index in range(300)])
+        OutgoingEmail.objects.bulk_create([
+            OutgoingEmail(recipient=f'user{index}@localhost', subject='Тема', body='Текст') for index in range(300)
+        ])
+
+    def get_cases(self):
+        token = f'{self.pending.pk:012d}'
+        User.objects.filter(pk=self.pending.pk).update(vrf_token=token)
+        staff, user, pk = self.staff, self.user, self.user.pk
+        return {
+            'login': (None, reverse('users:login'), 0),
+            'logout': (user, reverse('users:logout'), 4),
+            'register': (None, reverse('users:register'), 0),
+            'profile': (user, reverse('users:profile', args=[pk]), 2),
+            'generate_new_password': (user, reverse('users:generate_new_password'), 4),
+            'confirm': (None, reverse('users:confirm', args=[token]), 2),
+            'reset_password': (None, reverse('users:reset_password'), 0),
+            'users_list': (staff, reverse('users:users_list'), 3),
+            'detail': (staff, reverse('users:detail', args=[pk]), 3),
+            'delete': (staff, reverse('users:delete', args=[pk]), 3),
+            'toggle_status': (staff, reverse('users:toggle_status', args=[self.member.pk]), 4),
+        }
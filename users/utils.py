@@ -1,26 +1,111 @@
-import smtplib
+import datetime
 from email.mime.text import MIMEText
-from decouple import config
+from smtplib import SMTPException
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from main.services import get_retry_delay
+from main.smtp import get_connection_pool, is_temporary_error
+from users.models import OutgoingEmail
 
 
 def send_mail(to, theme, message):
-    """Функция по отправке сообщений пользователю"""
-    file_content = message
+    """Ставит письмо пользователю в очередь отправки, само письмо отправляет команда run_outbox"""
+    return OutgoingEmail.objects.create(recipient=to, subject=theme, body=message)
+
+
+def claim_outgoing_emails(limit=None):
+    """
+    Захватывает пачку писем, которым подошло время отправки. Захваченные
+    письма откладываются на OUTBOX_LEASE_TTL секунд, поэтому параллельные
+    обработчики их не получат.
+    """
+    if limit is None:
+        limit = settings.OUTBOX_BATCH_SIZE
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True).filter(
+                status=OutgoingEmail.STATUS_PENDING,
+                next_attempt_at__lte=now,
+            ).order_by('next_attempt_at', 'id').values_list('id', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        OutgoingEmail.objects.filter(id__in=ids).update(
+            next_attempt_at=now + datetime.timedelta(seconds=settings.OUTBOX_LEASE_TTL)
+        )
+    return list(OutgoingEmail.objects.filter(id__in=ids).order_by('id'))
+
 
-    msg = MIMEText(file_content)
-    msg['Subject'] = theme
-    msg['From'] = 'polinaskypro@yandex.ru'
-    msg['To'] = to
+def deliver_outgoing_email(outgoing_email):
+    """
+    Отправляет письмо из очереди через общий пул SMTP-соединений и обновляет его статус.
+    В письмах бывают пароли, поэтому после отправки или окончательной ошибки текст стирается.
+    """
+    msg = MIMEText(outgoing_email.body)
+    msg['Subject'] = outgoing_email.subject
+    msg['From'] = settings.EMAIL_HOST_USER
+    msg['To'] = outgoing_email.recipient
 
-    smtp_server = 'smtp.yandex.ru'
-    smtp_port = 465
-    smtp_username = 'polinaskypro@yandex.ru'
-    smtp_password = config('EMAIL_HOST_PASSWORD')
+    now = timezone.now()
+    outgoing_email.attempts += 1
+    try:
+        get_connection_pool().send(settings.EMAIL_HOST_USER, [outgoing_email.recipient], msg.as_string())
+    except (SMTPException, OSError) as e:
+        outgoing_email.last_error = str(e)
+        if is_temporary_error(e) and outgoing_email.attempts < settings.OUTBOX_MAX_ATTEMPTS:
+            outgoing_email.next_attempt_at = now + get_retry_delay(outgoing_email.attempts)
+        else:
+            outgoing_email.status = OutgoingEmail.STATUS_FAILED
+    else:
+        outgoing_email.status = OutgoingEmail.STATUS_SENT
+        outgoing_email.sent_at = now
+        outgoing_email.last_error = None
+    if outgoing_email.status != OutgoingEmail.STATUS_PENDING:
+        outgoing_email.body = ''
 
-    s = smtplib.SMTP_SSL(smtp_server, smtp_port)
-    s.login(smtp_username, smtp_password)
-    s.sendmail('polinaskypro@yandex.ru', [to], msg.as_string())
 
-    s.quit()
+def renew_lease(outgoing_email):
+    """
+    Продлевает аренду письма перед отправкой. Возвращает False, если аренда
+    уже истекла и письмо захватил другой обработчик.
+    """
+    leased_until = timezone.now() + datetime.timedelta(seconds=settings.OUTBOX_LEASE_TTL)
+    renewed = OutgoingEmail.objects.filter(
+        pk=outgoing_email.pk,
+        status=OutgoingEmail.STATUS_PENDING,
+        next_attempt_at=outgoing_email.next_attempt_at,
+    ).update(next_attempt_at=leased_until)
+    outgoing_email.next_attempt_at = leased_until
+    return bool(renewed)
 
 
+def deliver_outbox():
+    """
+    Отправляет все письма очереди, которым подошло время, возвращает число обработанных писем.
+    Пачка отправляется по одному письму и может не уложиться в OUTBOX_LEASE_TTL, поэтому
+    аренда каждого письма продлевается перед отправкой, а результат сохраняется сразу,
+    только пока аренда принадлежит этому обработчику.
+    """
+    delivered = 0
+    while True:
+        outgoing_emails = claim_outgoing_emails()
+        if not outgoing_emails:
+            return delivered
+        for outgoing_email in outgoing_emails:
+            if not renew_lease(outgoing_email):
+                continue
+            leased_until = outgoing_email.next_attempt_at
+            deliver_outgoing_email(outgoing_email)
+            OutgoingEmail.objects.filter(pk=outgoing_email.pk, next_attempt_at=leased_until).update(
+                status=outgoing_email.status,
+                attempts=outgoing_email.attempts,
+                next_attempt_at=outgoing_email.next_attempt_at,
+                sent_at=outgoing_email.sent_at,
+                last_error=outgoing_email.last_error,
+                body=outgoing_email.body,
+            )
+            delivered += 1
@@ -8,7 +8,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy, reverse
 from django.views import View
 from django.views.generic import CreateView, UpdateView, DeleteView, DetailView
-from config import settings
+from main.mixins import CachedObjectMixin, KeysetListMixin
 from users.form import UserForm, UserProfileForm
 from users.models import User
 from django.contrib import messages
@@ -78,7 +78,7 @@ class ProfileView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         if user.is_staff:
             return redirect(reverse_lazy('users:users_list'))
         else:
-            return redirect(reverse_lazy('agent:mailing_list'))
+            return redirect(reverse_lazy('main:mailing_list'))
 
     def get_object(self, queryset=None):
         return self.request.user
@@ -90,16 +90,14 @@ def generate_new_password(request):
     to = request.user.email
     subject = 'Вы сменили пароль!'
     message = f'Ваш новый пароль: {new_password}'
-    from_email = settings.EMAIL_HOST_USER
     send_mail(
-        subject=subject,
+        theme=subject,
         message=message,
-        from_email=from_email,
-        recipient_list=[to]
+        to=to
     )
     request.user.set_password(new_password)
     request.user.save()
-    return redirect(reverse('catalog:home'))
+    return redirect(reverse('blog:home_index'))
 
 
 def reset_password(request):
@@ -114,12 +112,10 @@ def reset_password(request):
 
             subject = "Смена пароля на платформе MailingAgent!"
             message = f"Ваш новый пароль: {new_password}"
-            from_email = settings.EMAIL_HOST_USER
             send_mail(
-                subject=subject,
+                theme=subject,
                 message=message,
-                from_email=from_email,
-                recipient_list=[user_email]
+                to=user_email
             )
             return redirect(reverse("users:login"))
         except User.DoesNotExist:
@@ -127,10 +123,10 @@ def reset_password(request):
     return render(request, 'users/change_password.html')
 
 
-class UsersListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
+class UsersListView(LoginRequiredMixin, UserPassesTestMixin, KeysetListMixin, ListView):
     model = User
     permission_required = 'users.view_user'
-    success_url = reverse_lazy('agent:mailing_list')
+    success_url = reverse_lazy('main:mailing_list')
     extra_context = {
         'title': 'Пользователи сервиса'
     }
@@ -138,7 +134,7 @@ class UsersListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
     def get_queryset(self):
         queryset = User.objects.filter(
             is_staff=False
-        )
+        ).only('first_name', 'last_name', 'email', 'country', 'phone', 'avatar', 'is_active')
         return queryset
 
     def test_func(self):
@@ -149,10 +145,10 @@ class UsersListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
         return False
 
     def handle_no_permission(self):
-        return redirect(reverse_lazy('agent:mailing_list'))
+        return redirect(reverse_lazy('main:mailing_list'))
 
 
-class UsersDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
+class UsersDetailView(LoginRequiredMixin, UserPassesTestMixin, CachedObjectMixin, DetailView):
     model = User
     extra_context = {
         'title': 'Информация о пользователе'
@@ -166,10 +162,10 @@ class UsersDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
         return False
 
     def handle_no_permission(self):
-        return redirect(reverse_lazy('agent:mailing_list'))
+        return redirect(reverse_lazy('main:mailing_list'))
 
 
-class UsersDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+class UsersDeleteView(LoginRequiredMixin, UserPassesTestMixin, CachedObjectMixin, DeleteView):
     model = User
     extra_context = {
         'title': 'Удаление пользователя'